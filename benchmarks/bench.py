@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+"""Benchmark `databricks_sync` commands against an offline fake workspace
+
+For each backend and workspace size, a fake workspace is served by `fake_workspace.py` and the `ls`,
+`export`, `diff` and `import` commands are run in-process against it, in a temporary home directory
+and git repository. The CLI backend runs the commands through a stub `databricks` CLI, the REST
+backend through the in-process REST client.
+
+Example:
+  python benchmarks/bench.py --sizes 100,1000,10000 --backends rest,cli --output bench.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+
+import fake_workspace  # noqa: E402
+from databricks_sync import DatabricksSync  # noqa: E402
+
+WORKSPACE_ROOT = "/Shared/bench"
+PROFILE = "bench"
+
+
+def start_server(args, objects):
+    """ start a fake workspace server, returning the process and its port """
+    cmd = [ sys.executable, os.path.join(BENCH_DIR, "fake_workspace.py"), "serve",
+            "--root", WORKSPACE_ROOT, "--objects", str(objects),
+            "--notebooks-per-folder", str(args.notebooks_per_folder),
+            "--folders-per-folder", str(args.folders_per_folder),
+            "--notebook-size", str(args.notebook_size),
+            "--latency-ms", str(args.latency_ms), "--throttle-rate", str(args.throttle_rate) ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, universal_newlines=True)
+    line = proc.stdout.readline()
+    if not line.startswith("serving"):
+        proc.kill()
+        raise RuntimeError("fake workspace did not start: {}".format(line))
+    return proc, int(line.split()[-1])
+
+
+def setup_environment(tmp_dir, port):
+    """ point `databricks_sync` and the stub CLI at the fake workspace """
+    home = os.path.join(tmp_dir, "home")
+    os.makedirs(os.path.join(home, ".databricks_sync"))
+    with open(os.path.join(home, ".databricks_sync", "config.txt"), "w") as f:
+        json.dump({ "default_profile": PROFILE, "default_root": "", "default_language": "PYTHON",
+                    "default_format": "SOURCE" }, f)
+    config_file = os.path.join(home, ".databrickscfg")
+    with open(config_file, "w") as f:
+        f.write("[{}]\nhost = http://127.0.0.1:{}\ntoken = bench\n".format(PROFILE, port))
+
+    bin_dir = os.path.join(tmp_dir, "bin")
+    fake_workspace.make_cli_stub(bin_dir)
+
+    os.environ["HOME"] = home
+    os.environ["DATABRICKS_CONFIG_FILE"] = config_file
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+    for var, value in (("GIT_AUTHOR_NAME", "bench"), ("GIT_AUTHOR_EMAIL", "bench@localhost"),
+                       ("GIT_COMMITTER_NAME", "bench"), ("GIT_COMMITTER_EMAIL", "bench@localhost")):
+        os.environ[var] = value
+
+
+def run_command(argv, stats_file):
+    """ run a databricks_sync command in-process, returning elapsed seconds and its stats report """
+    start = time.monotonic()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        DatabricksSync().sync(argv + [ "--stats", stats_file ])
+    elapsed = time.monotonic() - start
+    with open(stats_file) as f:
+        return elapsed, json.load(f)
+
+
+def summarize_calls(report):
+    """ reduce the per call stats to count, mean and max latency """
+    return { kind: { "count": x["count"], "mean_ms": round(x["mean_seconds"] * 1000, 3),
+                     "max_ms": round(x["max_seconds"] * 1000, 3) }
+             for kind, x in report["calls"].items() }
+
+
+def bench_size(args, backend, objects):
+    """ benchmark all operations for one backend and workspace size """
+    tmp_dir = tempfile.mkdtemp(prefix="databricks_sync_bench_")
+    proc, port = start_server(args, objects)
+    cwd = os.getcwd()
+    saved_env = dict(os.environ)
+    results = []
+    try:
+        setup_environment(tmp_dir, port)
+        repo = os.path.join(tmp_dir, "repo")
+        os.makedirs(repo)
+        os.chdir(repo)
+        subprocess.run([ "git", "init", "-q" ], check=True)
+        subprocess.run([ "git", "commit", "-q", "--allow-empty", "-m", "init" ], check=True)
+
+        common = [ "--transport", backend, "--engine", args.engine, "--jobs", str(args.jobs), "--no-cache" ]
+        operations = [
+            ("ls", [ "ls", "-R" ] + common + [ WORKSPACE_ROOT ]),
+            ("export", [ "export", "-R", "--format", "SOURCE" ] + common + [ WORKSPACE_ROOT, "." ]),
+            ("diff", [ "diff", "--content", "-R" ] + common + [ "./**/*", WORKSPACE_ROOT ]),
+            ("import", [ "import", "-R", "-l", "PYTHON" ] + common + [ "./**/*.py", WORKSPACE_ROOT + "_import" ]),
+        ]
+        for name, argv in operations:
+            if name not in args.operations:
+                continue
+            elapsed, report = run_command(argv, os.path.join(tmp_dir, "{}.json".format(name)))
+            result = { "backend": backend, "objects": objects, "operation": name,
+                       "seconds": round(elapsed, 3), "objects_per_second": round(objects / elapsed, 1),
+                       "phases": { k: round(v["seconds"], 3) for k, v in report["phases"].items() },
+                       "calls": summarize_calls(report), "counters": report["counters"] }
+            print("{:<6} {:>8} {:<8} {:>10.3f}s {:>12.1f} objects/s".format(backend, objects, name, elapsed,
+                                                                          result["objects_per_second"]),
+                  flush=True)
+            results.append(result)
+    finally:
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(saved_env)
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark databricks_sync against a fake workspace")
+    parser.add_argument("--sizes", default="100,1000,10000,100000",
+                        help="comma separated workspace sizes in objects (default: 100,1000,10000,100000)")
+    parser.add_argument("--backends", default="rest,cli", help="comma separated backends: rest, cli")
+    parser.add_argument("--operations", default="ls,export,diff,import",
+                        help="comma separated operations to run (default: ls,export,diff,import)")
+    parser.add_argument("--max-cli-objects", type=int, default=1000,
+                        help="largest size to run with the cli backend, which starts a process per call")
+    parser.add_argument("--jobs", type=int, default=8)
+    parser.add_argument("--engine", choices=["threads", "asyncio"], default="threads")
+    parser.add_argument("--notebooks-per-folder", type=int, default=20)
+    parser.add_argument("--folders-per-folder", type=int, default=5)
+    parser.add_argument("--notebook-size", type=int, default=2048)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="file to write json results to")
+    args = parser.parse_args()
+    args.operations = args.operations.split(",")
+
+    results = []
+    for backend in args.backends.split(","):
+        for objects in [ int(x) for x in args.sizes.split(",") ]:
+            if backend == "cli" and objects > args.max_cli_objects:
+                print("{:<6} {:>8} skipped (see --max-cli-objects)".format(backend, objects))
+                continue
+            results.extend(bench_size(args, backend, objects))
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
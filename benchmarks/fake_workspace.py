@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+
+"""Offline stand-ins for a Databricks workspace, for benchmarking `databricks_sync`
+
+The module serves a synthetic workspace tree in two ways:
+
+  fake_workspace.py serve [OPTIONS]      serve the workspace REST API (2.0) over local HTTP
+  fake_workspace.py cli workspace ...    act as the `databricks` CLI, forwarding to a `serve` instance
+
+The `cli` mode is installed on the PATH as `databricks` by `make_cli_stub`, so that the CLI transport
+of `databricks_sync` pays a process start per call, as it does with the real CLI.
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+import zipfile
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+# file extensions used for notebooks in source and DBC archives, by language
+SOURCE_EXTENSIONS = { "PYTHON": ".py", "SCALA": ".scala", "SQL": ".sql", "R": ".r" }
+DBC_EXTENSIONS = { "PYTHON": ".python", "SCALA": ".scala", "SQL": ".sql", "R": ".r" }
+COMMENT_PREFIXES = { "PYTHON": "#", "R": "#", "SCALA": "//", "SQL": "--" }
+LANGUAGES = [ "PYTHON", "SCALA", "SQL", "PYTHON" ]
+
+
+class FakeWorkspace:
+    """ In-memory workspace tree
+
+    Objects are kept by path, with an index of children by folder so that folder listings are O(children).
+    Contents of synthetic notebooks are generated on demand rather than stored.
+    """
+
+    def __init__(self, notebook_size=2048):
+        self.lock = threading.Lock()
+        self.objects = {}
+        self.children = {}
+        self.next_id = 1
+        self.notebook_size = notebook_size
+        self.add("/", "DIRECTORY")
+
+    def add(self, path, object_type, language=None, content=None):
+        """ add or replace an object, creating missing parent folders """
+        parent = os.path.dirname(path)
+        if path != "/" and parent not in self.objects:
+            self.add(parent, "DIRECTORY")
+        if path not in self.objects and path != "/":
+            self.children.setdefault(parent, []).append(path)
+        self.objects[path] = { "path": path, "object_type": object_type, "language": language,
+                               "object_id": self.next_id, "modified_at": int(time.time() * 1000),
+                               "content": content }
+        self.next_id = self.next_id + 1
+        if object_type == "DIRECTORY":
+            self.children.setdefault(path, [])
+
+    def delete(self, path):
+        """ delete object and any objects below it """
+        for child in list(self.children.get(path, [])):
+            self.delete(child)
+        self.children.pop(path, None)
+        del self.objects[path]
+        self.children[os.path.dirname(path)].remove(path)
+
+    def content(self, path):
+        """ get the source of a notebook """
+        obj = self.objects[path]
+        if obj["content"] is not None:
+            return obj["content"]
+        prefix = COMMENT_PREFIXES[obj["language"]]
+        header = "{} Databricks notebook source\n{} {}\n".format(prefix, prefix, path)
+        filler = "{} {}\n".format(prefix, "x" * 76)
+        lines = max(0, (self.notebook_size - len(header)) // len(filler))
+        return (header + filler * lines).encode("utf-8")
+
+    def generate(self, root, objects, notebooks_per_folder=20, folders_per_folder=5):
+        """ Generate a synthetic tree of about `objects` objects under root, breadth first """
+        self.add(root, "DIRECTORY")
+        folders = [ root ]
+        count = 0
+        index = 0
+        while count < objects and index < len(folders):
+            folder = folders[index]
+            index = index + 1
+            for i in range(notebooks_per_folder):
+                if count >= objects:
+                    break
+                language = LANGUAGES[(count + i) % len(LANGUAGES)]
+                self.add("{}/notebook_{}".format(folder, i), "NOTEBOOK", language)
+                count = count + 1
+            for i in range(folders_per_folder):
+                if count >= objects:
+                    break
+                sub_folder = "{}/folder_{}".format(folder, i)
+                self.add(sub_folder, "DIRECTORY")
+                folders.append(sub_folder)
+                count = count + 1
+        return count
+
+    def export_archive(self, path, format):
+        """ export folder as a SOURCE zip or DBC archive """
+        buffer = io.BytesIO()
+        base = os.path.basename(path)
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            folders = [ path ]
+            while len(folders) > 0:
+                for child in self.children.get(folders.pop(), []):
+                    obj = self.objects[child]
+                    if obj["object_type"] == "DIRECTORY":
+                        folders.append(child)
+                        continue
+                    name = base + child[len(path):]
+                    if format == "SOURCE":
+                        archive.writestr(name + SOURCE_EXTENSIONS[obj["language"]], self.content(child))
+                    else:
+                        notebook = { "name": os.path.basename(child), "language": obj["language"].lower(),
+                                     "commands": [ { "command": self.content(child).decode("utf-8") } ] }
+                        archive.writestr(name + DBC_EXTENSIONS[obj["language"]], json.dumps(notebook))
+        return buffer.getvalue()
+
+    def import_archive(self, path, data):
+        """ import DBC archive as folder `path` """
+        extensions = { v: k for k, v in DBC_EXTENSIONS.items() }
+        self.add(path, "DIRECTORY")
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            for name in archive.namelist():
+                notebook = json.loads(archive.read(name))
+                rel_path, ext = os.path.splitext(name.split("/", 1)[1])
+                content = "\n\n".join([ x["command"] for x in notebook["commands"] ]).encode("utf-8")
+                self.add(path + "/" + rel_path, "NOTEBOOK", extensions[ext], content)
+
+
+class WorkspaceRequestHandler(BaseHTTPRequestHandler):
+    """ Implements the subset of the workspace API used by `databricks_sync` """
+
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, without this each response waits for a delayed ack
+    disable_nagle_algorithm = True
+    workspace = None
+    latency = 0.0
+    throttle_rate = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, status, result):
+        data = json.dumps(result).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_raw(self, status, data):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def not_found(self, path):
+        self.send(404, { "error_code": "RESOURCE_DOES_NOT_EXIST", "message": "Path ({}) doesn't exist.".format(path) })
+
+    def delay(self):
+        """ inject latency, returning True if the request should be throttled """
+        if self.latency > 0:
+            time.sleep(self.latency)
+        if self.throttle_rate > 0 and random.random() < self.throttle_rate:
+            self.send(429, { "error_code": "REQUEST_LIMIT_EXCEEDED", "message": "Too many requests" })
+            return True
+        return False
+
+    def do_GET(self):
+        if self.delay():
+            return
+        url = urlsplit(self.path)
+        endpoint = url.path.rsplit("/", 1)[1]
+        params = { k: v[0] for k, v in parse_qs(url.query).items() }
+        path = params.get("path", "/").rstrip("/") or "/"
+        workspace = self.workspace
+
+        with workspace.lock:
+            obj = workspace.objects.get(path)
+            if obj is None:
+                return self.not_found(path)
+            if endpoint == "list":
+                if obj["object_type"] != "DIRECTORY":
+                    return self.send(200, { "objects": [ self.status(obj) ] })
+                children = [ self.status(workspace.objects[x]) for x in workspace.children.get(path, []) ]
+                return self.send(200, { "objects": children } if len(children) > 0 else {})
+            if endpoint == "get-status":
+                return self.send(200, self.status(obj))
+            if endpoint == "export":
+                format = params.get("format", "SOURCE")
+                if obj["object_type"] == "DIRECTORY":
+                    content = workspace.export_archive(path, format)
+                else:
+                    content = workspace.content(path)
+                if params.get("direct_download") == "true":
+                    return self.send_raw(200, content)
+                return self.send(200, { "content": base64.b64encode(content).decode("ascii") })
+        self.send(404, { "error_code": "ENDPOINT_NOT_FOUND", "message": url.path })
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.delay():
+            return
+        endpoint = urlsplit(self.path).path.rsplit("/", 1)[1]
+        path = body.get("path", "/").rstrip("/") or "/"
+        workspace = self.workspace
+
+        with workspace.lock:
+            if endpoint == "mkdirs":
+                if path not in workspace.objects:
+                    workspace.add(path, "DIRECTORY")
+                return self.send(200, {})
+            if endpoint == "delete":
+                if path not in workspace.objects:
+                    return self.not_found(path)
+                workspace.delete(path)
+                return self.send(200, {})
+            if endpoint == "import":
+                exists = path in workspace.objects
+                if exists and (not body.get("overwrite") or body.get("format") == "DBC"):
+                    return self.send(400, { "error_code": "RESOURCE_ALREADY_EXISTS",
+                                            "message": "Path ({}) already exists.".format(path) })
+                content = base64.b64decode(body.get("content", ""))
+                if body.get("format") == "DBC":
+                    workspace.import_archive(path, content)
+                else:
+                    workspace.add(path, "NOTEBOOK", body.get("language", "PYTHON"), content)
+                return self.send(200, {})
+        self.send(404, { "error_code": "ENDPOINT_NOT_FOUND", "message": self.path })
+
+    @staticmethod
+    def status(obj):
+        return { k: v for k, v in obj.items() if k != "content" and v is not None }
+
+
+def serve(args):
+    """ serve a synthetic workspace until interrupted """
+    workspace = FakeWorkspace(notebook_size=args.notebook_size)
+    count = workspace.generate(args.root, args.objects, notebooks_per_folder=args.notebooks_per_folder,
+                               folders_per_folder=args.folders_per_folder)
+    handler = type("Handler", (WorkspaceRequestHandler,), { "workspace": workspace,
+                                                            "latency": args.latency_ms / 1000.0,
+                                                            "throttle_rate": args.throttle_rate })
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), handler)
+    server.daemon_threads = True
+    print("serving {} objects under {} on port {}".format(count, args.root, server.server_address[1]), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def cli(argv):
+    """ act as the `databricks workspace` CLI against a `serve` instance """
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    from databricks_sync import WorkspaceClient
+
+    profile = None
+    if "--profile" in argv:
+        profile = argv[argv.index("--profile") + 1]
+    if len(argv) < 2 or argv[0] != "workspace":
+        sys.stderr.write("Error: unsupported command {}\n".format(argv))
+        return 1
+
+    client = WorkspaceClient.from_profile(profile, pool_size=1)
+    result, output = client.execute(["databricks"] + argv)
+    if len(result.stdout) > 0:
+        print(result.stdout)
+    if result.returncode != 0:
+        sys.stderr.write("Error: {}\n".format(result.stderr))
+    return result.returncode
+
+
+def make_cli_stub(bin_dir):
+    """ create a `databricks` executable in `bin_dir` running this module in `cli` mode """
+    os.makedirs(bin_dir, exist_ok=True)
+    stub = os.path.join(bin_dir, "databricks")
+    with open(stub, "w") as f:
+        f.write("#!/bin/sh\nexec \"{}\" \"{}\" cli \"$@\"\n".format(sys.executable, os.path.abspath(__file__)))
+    os.chmod(stub, 0o755)
+    return stub
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "cli":
+        sys.exit(cli(sys.argv[2:]))
+
+    parser = argparse.ArgumentParser(description="Serve a synthetic Databricks workspace for benchmarking")
+    parser.add_argument("command", choices=["serve"])
+    parser.add_argument("--port", type=int, default=0, help="port to listen on (default: any free port)")
+    parser.add_argument("--root", default="/Shared/bench", help="workspace folder to generate the tree under")
+    parser.add_argument("--objects", type=int, default=1000, help="number of notebooks and folders to generate")
+    parser.add_argument("--notebooks-per-folder", type=int, default=20)
+    parser.add_argument("--folders-per-folder", type=int, default=5)
+    parser.add_argument("--notebook-size", type=int, default=2048, help="size of generated notebooks in bytes")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latency to add to each request")
+    parser.add_argument("--throttle-rate", type=float, default=0.0,
+                        help="fraction of requests to reject with HTTP 429")
+    serve(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
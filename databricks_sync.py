@@ -2,21 +2,1078 @@
 
 #imports
 import argparse
+import asyncio
 import os
 import json
 import logging
-import glob
+import mmap
 import subprocess
 import re
 import sys
-from operator import itemgetter
-import fnmatch
+from operator import attrgetter, itemgetter
+import base64
+import bisect
+import difflib
+import hashlib
+import io
+import shutil
+import tempfile
+import zipfile
+import configparser
+import contextlib
+import http.client
+import queue
+import random
+import socket
+import socketserver
+import sqlite3
+import threading
+import time
+import traceback
+import urllib.parse
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
 
 # typical workflow:
 #
 #
 
 
+class WorkspaceApiError(RuntimeError):
+    """ Error returned by the Databricks workspace REST API """
+
+    def __init__(self, status, message, error_code=None):
+        super().__init__("{} ({}): {}".format(error_code or "HTTP_ERROR", status, message))
+        self.status = status
+        self.error_code = error_code
+        self.message = message
+
+
+class WorkspaceClient:
+    """ In-process client for the Databricks workspace REST API
+
+    Keeps a pool of keep-alive connections so that repeated listing, export, import and mkdirs
+    calls do not pay process startup and TLS handshake costs. It reads the same profiles as the
+    `databricks` CLI and can execute the `databricks workspace ...` command lists built by
+    `DatabricksSync`, so that it can be used as a drop in transport for them.
+    """
+
+    api_prefix = "/api/2.0/workspace"
+
+    def __init__(self, host, token=None, username=None, password=None, pool_size=8, timeout=120):
+        url = urllib.parse.urlsplit(host if "://" in host else "https://" + host)
+        self.scheme = url.scheme
+        self.netloc = url.netloc
+        self.base_path = url.path.rstrip("/")
+        self.timeout = timeout
+        self.logger = logging.getLogger("DatabricksSync")
+        self.headers = { "Content-Type": "application/json", "User-Agent": "databricks_sync" }
+        if token:
+            self.headers["Authorization"] = "Bearer {}".format(token)
+        elif username is not None:
+            credentials = "{}:{}".format(username, password or "").encode("utf-8")
+            self.headers["Authorization"] = "Basic {}".format(base64.b64encode(credentials).decode("ascii"))
+        self.pool = queue.LifoQueue(maxsize=max(1, pool_size))
+        # mode of newly exported files, as `open` would create them
+        umask = os.umask(0o022)
+        os.umask(umask)
+        self.file_mode = 0o666 & ~umask
+
+    @staticmethod
+    def config_file():
+        """ location of the databricks CLI configuration file """
+        return os.environ.get("DATABRICKS_CONFIG_FILE", os.path.join(os.path.expanduser("~"), ".databrickscfg"))
+
+    @classmethod
+    def from_profile(cls, profile=None, pool_size=8):
+        """ Create a client from a profile in the databricks CLI configuration file """
+        profile = profile or "DEFAULT"
+        config = configparser.ConfigParser()
+        config.read(cls.config_file())
+        if profile != "DEFAULT" and not config.has_section(profile):
+            raise RuntimeError("Profile [{}] not found in {}".format(profile, cls.config_file()))
+        section = config[profile]
+        host = section.get("host")
+        if not host:
+            raise RuntimeError("Profile [{}] does not define a host".format(profile))
+        return cls(host, token=section.get("token"), username=section.get("username"),
+                   password=section.get("password"), pool_size=pool_size)
+
+    def _new_connection(self):
+        if self.scheme == "http":
+            return http.client.HTTPConnection(self.netloc, timeout=self.timeout)
+        return http.client.HTTPSConnection(self.netloc, timeout=self.timeout)
+
+    def _get_connection(self):
+        try:
+            return self.pool.get_nowait()
+        except queue.Empty:
+            return self._new_connection()
+
+    def _release_connection(self, conn):
+        try:
+            self.pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        """ close all pooled connections """
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _open(self, method, endpoint, params=None, payload=None, headers=None):
+        """ Send a request against the workspace API, returning the connection and the response yet to be read
+
+        The response's `retried` attribute tells if the request was sent again, so it may have been handled twice.
+
+        :param payload: request body as bytes, or a function returning an iterable of chunks of the body
+        """
+        url = "{}{}/{}".format(self.base_path, self.api_prefix, endpoint)
+        if params:
+            url = url + "?" + urllib.parse.urlencode(params)
+
+        # a pooled connection may have been closed by the server - retry once on a fresh one
+        for attempt in range(2):
+            conn = self._get_connection()
+            try:
+                conn.request(method, url, body=payload() if callable(payload) else payload,
+                             headers=headers or self.headers)
+                response = conn.getresponse()
+                response.retried = attempt > 0
+                return conn, response
+            except (http.client.HTTPException, ConnectionError) as err:
+                conn.close()
+                if attempt > 0:
+                    raise
+                self.logger.debug("retrying request on new connection: %s", str(err))
+
+    def _finish(self, conn, response):
+        """ return connection to the pool once its response has been read """
+        if response.will_close:
+            conn.close()
+        else:
+            self._release_connection(conn)
+
+    def _check_response(self, response, data):
+        """ decode json response, raising `WorkspaceApiError` if the request failed
+
+        Error responses may not be json, as with the error pages of proxies and gateways, so the status is checked
+        first and the error keeps its status to be retried if transient.
+        """
+        text = data.decode("utf-8", "replace")
+        try:
+            result = json.loads(text) if len(data) > 0 else {}
+        except ValueError:
+            if response.status == 200:
+                raise WorkspaceApiError(response.status, "invalid json response: {}".format(text[:200]))
+            result = None
+        if response.status != 200:
+            error_code = result.get("error_code") if isinstance(result, dict) else None
+            message = result.get("message") if isinstance(result, dict) else None
+            raise WorkspaceApiError(response.status, message or text, error_code)
+        return result
+
+    def _request(self, method, endpoint, params=None, body=None, payload=None, headers=None, retried_error=None):
+        """ Issue a request against the workspace API and return the decoded json response
+
+        :param retried_error: error code returned by a request that is not idempotent when an earlier attempt
+                              did succeed. The error is ignored if the request was sent again
+        """
+        if body is not None:
+            payload = json.dumps(body).encode("utf-8")
+        conn, response = self._open(method, endpoint, params=params, payload=payload, headers=headers)
+        try:
+            data = response.read()
+        except BaseException:
+            conn.close()
+            raise
+        self._finish(conn, response)
+        try:
+            return self._check_response(response, data)
+        except WorkspaceApiError as err:
+            if not response.retried or retried_error is None or err.error_code != retried_error:
+                raise
+            self.logger.debug("%s of retried request: earlier attempt succeeded", err.error_code)
+            return {}
+
+    def list(self, path):
+        """ list objects in workspace folder """
+        return self._request("GET", "list", params={"path": path}).get("objects", [])
+
+    def mkdirs(self, path):
+        """ create workspace folder and any missing parents """
+        self._request("POST", "mkdirs", body={"path": path})
+
+    def delete(self, path, recursive=False):
+        """ delete workspace object """
+        self._request("POST", "delete", body={"path": path, "recursive": recursive},
+                      retried_error="RESOURCE_DOES_NOT_EXIST")
+
+    def export_to_file(self, path, format, tgt_file, overwrite=False, chunk_size=1024 * 1024):
+        """ export workspace object to local file
+
+        The object is downloaded directly, without base64 encoding, and written a chunk at a time to a
+        temporary file next to `tgt_file`, which replaces `tgt_file` once complete. Memory use does not
+        depend on the size of the object, and a failed export leaves any existing file unchanged.
+        """
+        if os.path.exists(tgt_file) and not overwrite:
+            raise RuntimeError("{} exists - use `--overwrite` to overwrite it".format(tgt_file))
+        mode = os.stat(tgt_file).st_mode & 0o7777 if os.path.exists(tgt_file) else self.file_mode
+
+        conn, response = self._open("GET", "export", params={"path": path, "format": format.upper(),
+                                                             "direct_download": "true"})
+        try:
+            if response.status != 200:
+                self._check_response(response, response.read())
+            # named after the target, so that exporting again replaces a file left by an interrupted export
+            tmp_file = os.path.join(os.path.dirname(tgt_file), ".{}.databricks_sync.tmp".format(os.path.basename(tgt_file)))
+            try:
+                with open(tmp_file, "wb") as f:
+                    if (response.getheader("Content-Type") or "").startswith("application/json"):
+                        # servers without direct download return the content base64 encoded in json
+                        size = self._decode_content(response, f, chunk_size)
+                    else:
+                        size = 0
+                        while True:
+                            chunk = response.read(chunk_size)
+                            if len(chunk) == 0:
+                                break
+                            f.write(chunk)
+                            size = size + len(chunk)
+                os.chmod(tmp_file, mode)
+                os.replace(tmp_file, tgt_file)
+            except BaseException:
+                if os.path.exists(tmp_file):
+                    os.unlink(tmp_file)
+                raise
+        except BaseException:
+            conn.close()
+            raise
+        self._finish(conn, response)
+        return size
+
+    # start of the base64 encoded content in a json export response
+    re_content_start = re.compile(rb'"content"\s*:\s*"')
+
+    def _decode_content(self, response, f, chunk_size):
+        """ decode the base64 `content` field of a json export response to file, a chunk at a time """
+        buffer = b""
+        while True:
+            match = self.re_content_start.search(buffer)
+            if match is not None:
+                buffer = buffer[match.end():]
+                break
+            chunk = response.read(chunk_size)
+            if len(chunk) == 0:
+                return 0
+            # keep the end of the buffer in case the field name spans chunks
+            buffer = buffer[-32:] + chunk
+
+        size = 0
+        pending = b""
+        while True:
+            end = buffer.find(b'"')
+            data = pending + (buffer if end < 0 else buffer[:end])
+            # base64 has no characters json needs to escape, but `/` may be escaped anyway
+            hold = b"\\" if end < 0 and data.endswith(b"\\") else b""
+            data = data[:len(data) - len(hold)].replace(b"\\/", b"/")
+            usable = len(data) - len(data) % 4
+            decoded = base64.b64decode(data[:usable])
+            f.write(decoded)
+            size = size + len(decoded)
+            pending = data[usable:] + hold
+            if end >= 0:
+                break
+            buffer = response.read(chunk_size)
+            if len(buffer) == 0:
+                raise RuntimeError("export response ended within the content")
+        if len(pending) > 0:
+            raise RuntimeError("export response content is not valid base64")
+        response.read()
+        return size
+
+    def import_file(self, src_file, path, format, language=None, overwrite=False, chunk_size=3 * 256 * 1024):
+        """ import local file as workspace object
+
+        The file is memory mapped and base64 encoded into the request body a chunk at a time, so memory use does
+        not depend on the size of the file. `chunk_size` must be a multiple of 3.
+        """
+        body = { "path": path, "format": format.upper(), "overwrite": overwrite }
+        if language is not None:
+            body["language"] = language.upper()
+        # the encoded content is streamed as the last field of the json body
+        prefix = (json.dumps(body)[:-1] + ', "content": "').encode("utf-8")
+        suffix = b'"}'
+
+        with open(src_file, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            content = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size > 0 else b""
+            try:
+                def payload():
+                    yield prefix
+                    for offset in range(0, size, chunk_size):
+                        yield base64.b64encode(content[offset:offset + chunk_size])
+                    yield suffix
+
+                headers = dict(self.headers)
+                headers["Content-Length"] = str(len(prefix) + 4 * ((size + 2) // 3) + len(suffix))
+                self._request("POST", "import", payload=payload, headers=headers,
+                              retried_error=None if overwrite else "RESOURCE_ALREADY_EXISTS")
+            finally:
+                if size > 0:
+                    content.close()
+        return size
+
+    @staticmethod
+    def _ls_row(obj, extended, absolute_paths):
+        """ format object as a row of `databricks workspace ls` output """
+        path = obj.get("path", "")
+        if not absolute_paths:
+            path = os.path.basename(path)
+        if extended:
+            return "{:<10} {}  {}".format(obj.get("object_type", ""), path, obj.get("language", ""))
+        return path
+
+    def execute(self, cmd):
+        """ Execute `databricks workspace ...` command list in-process
+
+        Returns results in same form as `DatabricksSync.execute_cmd_ex`
+        """
+        flags = set()
+        options = {}
+        positional = []
+        remaining = list(cmd[3:])
+        while len(remaining) > 0:
+            arg = remaining.pop(0)
+            if arg in ("--profile", "--format", "--language", "-f", "-l"):
+                if cmd[2] == "ls" and arg == "-l":
+                    flags.add(arg)
+                else:
+                    options[arg] = remaining.pop(0)
+            elif arg.startswith("-"):
+                flags.add(arg)
+            else:
+                positional.append(arg)
+
+        output = []
+        listing_info = {}
+        try:
+            if cmd[2] == "ls":
+                for obj in self.list(positional[0]):
+                    output.append(self._ls_row(obj, "-l" in flags, "--absolute" in flags))
+                    listing_info[obj.get("path")] = { k: obj[k] for k in ("object_id", "modified_at") if k in obj }
+            elif cmd[2] == "mkdirs":
+                self.mkdirs(positional[0])
+            elif cmd[2] in ("rm", "delete"):
+                self.delete(positional[0], recursive="-r" in flags or "--recursive" in flags)
+            elif cmd[2] == "export":
+                self.export_to_file(positional[0], options.get("--format", options.get("-f", "SOURCE")),
+                                    positional[1], overwrite="--overwrite" in flags or "-o" in flags)
+            elif cmd[2] == "import":
+                self.import_file(positional[0], positional[1], options.get("--format", options.get("-f", "SOURCE")),
+                                 language=options.get("--language", options.get("-l")),
+                                 overwrite="--overwrite" in flags or "-o" in flags)
+            else:
+                raise RuntimeError("workspace command not supported by REST transport: {}".format(cmd[2]))
+        except (WorkspaceApiError, RuntimeError, OSError, http.client.HTTPException) as err:
+            result = subprocess.CompletedProcess(cmd, 1, stdout="\n".join(output), stderr=str(err))
+            # HTTP status of failed call, with connection failures reported as 503 so they are retried
+            if isinstance(err, WorkspaceApiError):
+                result.http_status = err.status
+            elif isinstance(err, (ConnectionError, TimeoutError, http.client.HTTPException)):
+                result.http_status = 503
+            return result, output
+
+        result = subprocess.CompletedProcess(cmd, 0, stdout="\n".join(output), stderr="")
+        result.listing_info = listing_info
+        return result, output
+
+
+class RateLimiter:
+    """ Shared limiter for workspace API calls
+
+    Calls are admitted by a token bucket, if a maximum rate is set, and by an adaptive concurrency limit.
+    The concurrency limit follows AIMD (additive increase, multiplicative decrease): it is halved whenever
+    a call is throttled and grows by about one for each limit's worth of successful calls, up to
+    `max_concurrency`.
+    """
+
+    def __init__(self, max_concurrency, rate=None, burst=None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = float(self.max_concurrency)
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate or 1.0)
+        self.tokens = self.burst
+        self.last_refill = time.monotonic()
+        self.in_use = 0
+        self.cond = threading.Condition()
+
+    def _take_token(self):
+        """ take a token from the bucket, returning 0 or the time to wait until one is available """
+        if self.rate is None:
+            return 0
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+        if self.tokens >= 1:
+            self.tokens = self.tokens - 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """ wait until a call may be made """
+        with self.cond:
+            while True:
+                wait_time = None
+                if self.in_use < int(self.limit):
+                    wait_time = self._take_token()
+                    if wait_time == 0:
+                        self.in_use = self.in_use + 1
+                        return
+                self.cond.wait(wait_time)
+
+    def try_acquire(self):
+        """ admit a call if possible without waiting
+
+        :return: 0 if admitted, else the time to wait for a token, or None if waiting for a call to end
+        """
+        with self.cond:
+            if self.in_use >= int(self.limit):
+                return None
+            wait_time = self._take_token()
+            if wait_time == 0:
+                self.in_use = self.in_use + 1
+            return wait_time
+
+    async def acquire_async(self):
+        """ wait until a call may be made, without blocking the event loop """
+        while True:
+            wait_time = self.try_acquire()
+            if wait_time == 0:
+                return
+            await asyncio.sleep(wait_time if wait_time is not None else 0.01)
+
+    def release(self, throttled=False):
+        """ record the end of a call, adapting the concurrency limit """
+        with self.cond:
+            self.in_use = self.in_use - 1
+            if throttled:
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            self.cond.notify_all()
+
+
+class AsyncEngine:
+    """ Event loop running plan commands as coroutines
+
+    The loop runs in a background thread and coroutines are submitted to it from synchronous code with `submit`,
+    which returns a `concurrent.futures.Future`, so the engine can take the place of a thread pool.
+    Concurrency is bounded by a semaphore per resource: `api` for workspace API calls, `disk` for local
+    file work and `git` for git commands. Subprocesses are run with `asyncio.create_subprocess_exec`; REST calls
+    and in-process steps, which block, run on the loop's worker threads.
+    """
+
+    def __init__(self, api_limit, disk_limit, git_limit=1):
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(ThreadPoolExecutor(max_workers=api_limit + disk_limit))
+        self.thread = threading.Thread(target=self.loop.run_forever, name="AsyncEngine", daemon=True)
+        self.thread.start()
+        self.semaphores = self.submit(self._make_semaphores(api_limit, disk_limit, git_limit)).result()
+
+    async def _make_semaphores(self, api_limit, disk_limit, git_limit):
+        return { "api": asyncio.Semaphore(api_limit), "disk": asyncio.Semaphore(disk_limit),
+                 "git": asyncio.Semaphore(git_limit) }
+
+    def submit(self, coro):
+        """ schedule coroutine on the loop, returning a future for its result """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def in_loop(self):
+        """ check if called from the loop's thread """
+        return threading.current_thread() is self.thread
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.run_until_complete(self.loop.shutdown_default_executor())
+        self.loop.close()
+
+
+class RunJournal:
+    """ Append-only journal of the progress of a run, from which an interrupted run can be resumed
+
+    The first record holds the plan of the run, followed by a record for each command as it completes and a final
+    record once the run is complete. Records are lines of json, each appended with a single write and synced to
+    disk, so a run that is killed leaves at most a partial last line. That line is ignored when the journal is
+    read and cut off before the journal is appended to again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.fd = None
+        self.valid_length = 0
+
+    def create(self, header):
+        """ start a new journal with its first record, atomically replacing any previous journal """
+        tmp_file = self.path + ".tmp"
+        self.fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o644)
+        self.append(header)
+        os.replace(tmp_file, self.path)
+
+    def open(self):
+        """ continue an existing journal after the last complete record read """
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        os.ftruncate(self.fd, self.valid_length)
+
+    def append(self, record):
+        """ append a record and sync it to disk """
+        data = (json.dumps(record) + "\n").encode("utf-8")
+        with self.lock:
+            while len(data) > 0:
+                data = data[os.write(self.fd, data):]
+            os.fsync(self.fd)
+
+    def read(self):
+        """ read the complete records of the journal, or None if there is no journal """
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        records = []
+        self.valid_length = 0
+        for line in data.split(b"\n")[:-1]:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+            self.valid_length = self.valid_length + len(line) + 1
+        return records
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class RunStats:
+    """ Timing and counters for a single run
+
+    Records wall time per phase, and per kind of command the number of calls, a latency histogram,
+    bytes transferred and retries. Results are reported as json and optionally as a Chrome trace
+    event file, which can be loaded in `chrome://tracing` or Perfetto.
+    """
+
+    # upper bounds, in milliseconds, of latency histogram buckets
+    buckets = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000]
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start = time.monotonic()
+        self.phases = {}
+        self.calls = {}
+        self.counters = { "bytes_downloaded": 0, "bytes_uploaded": 0, "retries": 0, "throttled": 0,
+                          "subprocesses": 0 }
+        self.trace_events = []
+
+    def _trace(self, name, category, start, duration):
+        self.trace_events.append({ "name": name, "cat": category, "ph": "X", "pid": os.getpid(),
+                                   "tid": threading.get_ident(),
+                                   "ts": int((start - self.start) * 1000000), "dur": int(duration * 1000000) })
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """ context manager to time a phase of the run """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            duration = time.monotonic() - start
+            with self.lock:
+                phase = self.phases.setdefault(name, { "count": 0, "seconds": 0.0 })
+                phase["count"] = phase["count"] + 1
+                phase["seconds"] = phase["seconds"] + duration
+                self._trace(name, "phase", start, duration)
+
+    def record_call(self, kind, start, duration, failed=False):
+        """ record a single command or API call """
+        with self.lock:
+            call = self.calls.setdefault(kind, { "count": 0, "failed": 0, "seconds": 0.0, "max_seconds": 0.0,
+                                                 "histogram_ms": [0] * (len(self.buckets) + 1) })
+            call["count"] = call["count"] + 1
+            call["failed"] = call["failed"] + (1 if failed else 0)
+            call["seconds"] = call["seconds"] + duration
+            call["max_seconds"] = max(call["max_seconds"], duration)
+            bucket = next((i for i, x in enumerate(self.buckets) if duration * 1000 <= x), len(self.buckets))
+            call["histogram_ms"][bucket] = call["histogram_ms"][bucket] + 1
+            self._trace(kind, "call", start, duration)
+
+    def count(self, counter, value=1):
+        """ add to a counter """
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def report(self):
+        """ get the stats as a json serializable dictionary """
+        with self.lock:
+            calls = {}
+            for kind, call in self.calls.items():
+                calls[kind] = dict(call)
+                calls[kind]["mean_seconds"] = call["seconds"] / call["count"]
+                calls[kind]["histogram_ms"] = { ("<={}".format(bound) if i < len(self.buckets) else ">{}".format(
+                                                    self.buckets[-1])): n
+                                                for i, (bound, n) in enumerate(zip(self.buckets + [None],
+                                                                                   call["histogram_ms"])) if n > 0 }
+            return { "wall_seconds": time.monotonic() - self.start,
+                     "phases": dict(self.phases),
+                     "calls": calls,
+                     "counters": dict(self.counters) }
+
+    def write(self, stats_file=None, trace_file=None):
+        """ write the json report and trace event file. A `stats_file` of `-` writes to stdout """
+        if stats_file == "-":
+            print(json.dumps(self.report(), indent=2))
+        elif stats_file is not None:
+            with open(stats_file, "w") as f:
+                json.dump(self.report(), f, indent=2)
+        if trace_file is not None:
+            with open(trace_file, "w") as f:
+                with self.lock:
+                    json.dump({ "traceEvents": self.trace_events, "displayTimeUnit": "ms" }, f)
+
+
+class WorkspaceCatalog:
+    """ Persistent catalog of workspace folder listings
+
+    Each folder listing is stored, per profile, with the time it was fetched, so that listings can be
+    answered locally while they are fresh and only stale folders are listed again. When the catalog grows
+    beyond `max_size` bytes of listing data, the least recently fetched folders are evicted.
+    """
+
+    def __init__(self, db_file, max_size=64 * 1024 * 1024):
+        self.db_file = db_file
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False, timeout=30)
+        with self.lock, self.conn:
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS folders (
+                                   profile TEXT NOT NULL,
+                                   path TEXT NOT NULL,
+                                   fetched_at REAL NOT NULL,
+                                   size INTEGER NOT NULL,
+                                   lines TEXT NOT NULL,
+                                   info TEXT,
+                                   PRIMARY KEY (profile, path))""")
+
+    def get(self, profile, path, ttl):
+        """ Get listing lines and object info for folder if fetched within `ttl` seconds, else None """
+        with self.lock:
+            row = self.conn.execute("SELECT fetched_at, lines, info FROM folders WHERE profile = ? AND path = ?",
+                                    (profile, path)).fetchone()
+        if row is None or time.time() - row[0] > ttl:
+            return None
+        return json.loads(row[1]), json.loads(row[2]) if row[2] is not None else None
+
+    def put(self, profile, path, lines, info=None):
+        """ Store listing lines and object info for folder """
+        lines_text = json.dumps(lines)
+        info_text = json.dumps(info) if info is not None else None
+        size = len(lines_text) + (len(info_text) if info_text is not None else 0)
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO folders (profile, path, fetched_at, size, lines, info) "
+                              "VALUES (?, ?, ?, ?, ?, ?)",
+                              (profile, path, time.time(), size, lines_text, info_text))
+
+    def invalidate(self, profile, path, descendants=False):
+        """ Invalidate listings affected by a change to `path` - the folder itself and its ancestors """
+        path = path.rstrip("/") or "/"
+        folders = [ path ]
+        while path not in ("", "/"):
+            path = os.path.dirname(path)
+            folders.append(path)
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM folders WHERE profile = ? AND path = ?",
+                                  [ (profile, x) for x in folders ])
+            if descendants:
+                self.conn.execute("DELETE FROM folders WHERE profile = ? AND substr(path, 1, ?) = ?",
+                                  (profile, len(folders[0]) + 1, folders[0] + "/"))
+
+    def evict(self):
+        """ Evict least recently fetched folders while catalog is larger than its maximum size """
+        with self.lock, self.conn:
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM folders").fetchone()[0]
+            if total <= self.max_size:
+                return 0
+            evicted = 0
+            for profile, path, size in self.conn.execute("SELECT profile, path, size FROM folders "
+                                                         "ORDER BY fetched_at").fetchall():
+                if total <= self.max_size:
+                    break
+                self.conn.execute("DELETE FROM folders WHERE profile = ? AND path = ?", (profile, path))
+                total = total - size
+                evicted = evicted + 1
+            return evicted
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class WorkspaceListing:
+    """ Compact store of the paths of a workspace listing
+
+    Paths are kept as a parent pointer table of interned names, one node per listed object, so folders and names
+    shared between entries are only held once. Node 0 is the folder listed. Objects outside it, as when listing a
+    notebook rather than a folder, are kept with their whole path as name and no parent.
+    """
+
+    def __init__(self, root, absolute_paths=False):
+        """ :param root: path of the listed folder, ending in `/` """
+        self.root = root
+        self.absolute_paths = absolute_paths
+        self.parents = array("i", [ -1 ])
+        self.names = [ root ]
+
+    def add(self, parent, path):
+        """ add the object at workspace path `path` below node `parent`, returning its node """
+        if parent >= 0 and path.startswith(self.root):
+            name = path.rsplit("/", 1)[-1]
+        else:
+            parent, name = -1, path
+        self.parents.append(parent)
+        self.names.append(sys.intern(name))
+        return len(self.names) - 1
+
+    def path(self, node, absolute=None):
+        """ get the path of a node, relative to the listed folder unless listing absolute paths or `absolute` """
+        if self.parents[node] < 0:
+            return self.names[node]
+        names = []
+        while node > 0:
+            names.append(self.names[node])
+            node = self.parents[node]
+        path = "/".join(reversed(names))
+        return self.root + path if (self.absolute_paths if absolute is None else absolute) else path
+
+
+class ListingEntry:
+    """ Entry of a workspace listing, indexable as the tuple (type, listing line, path, language, object info)
+
+    Entries compare equal to the tuples they stand for. The path and listing line are computed from the
+    `WorkspaceListing` when needed rather than stored: the listing line is only kept for the CLI transport, and
+    then only when it is not formatted as the REST transport formats it. Entries of other object types keep their listing line and
+    path as listed.
+    """
+
+    __slots__ = ("listing", "kind", "node", "language", "object_id", "modified_at", "row", "other")
+
+    def __init__(self, listing, kind, node, language="", info=None, row=None, other=None):
+        """ :param info: dictionary holding the object id and modification time, if known
+            :param row: listing line of the CLI transport, kept only if it differs from the formatted line
+        """
+        self.listing = listing
+        self.kind = kind
+        self.node = node
+        self.language = language
+        self.object_id = info.get("object_id") if info is not None else None
+        self.modified_at = info.get("modified_at") if info is not None else None
+        self.row = row if row is not None and row != self.format_line(listing.path(node, absolute=True)) else None
+        self.other = other
+
+    @property
+    def path(self):
+        if self.other is not None:
+            return self.other[1]
+        path = self.listing.path(self.node)
+        return path + "/" if self.kind == "FOLDER" else path
+
+    @property
+    def line(self):
+        if self.other is not None:
+            return self.other[0]
+        if self.row is not None:
+            return self.row if self.listing.absolute_paths else self.row.replace(self.listing.root, "")
+        return self.format_line(self.listing.path(self.node))
+
+    @property
+    def info(self):
+        if self.object_id is None and self.modified_at is None:
+            return None
+        return { k: v for k, v in (("object_id", self.object_id), ("modified_at", self.modified_at))
+                 if v is not None }
+
+    def format_line(self, path):
+        """ format the listing line of the entry as the REST transport does """
+        object_type = "DIRECTORY" if self.kind == "FOLDER" else self.kind
+        return "{:<10} {}  {}".format(object_type, path, self.language)
+
+    # attributes in tuple order
+    fields = tuple([ attrgetter(x) for x in ("kind", "line", "path", "language", "info") ])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self)[index]
+        return self.fields[index](self)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __iter__(self):
+        return (x(self) for x in self.fields)
+
+    def __repr__(self):
+        return repr(tuple(self))
+
+    def __eq__(self, other):
+        if isinstance(other, (tuple, ListingEntry)):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __hash__(self):
+        # as the tuple, which is not hashable when it holds object info
+        return hash(tuple(self))
+
+
+class GitStatusIndex:
+    """ Index of the changes reported by a single `git status --porcelain=v2 -z` run
+
+    Entries are kept sorted by path, relative to the current directory, so that the changes at or below a path
+    are found by binary search.
+    """
+
+    def __init__(self, entries):
+        """ :param entries: list of tuples of (short format status, path, original path of renames or None) """
+        self.entries = sorted(entries, key=itemgetter(1))
+        self.paths = [ x[1] for x in self.entries ]
+
+    @classmethod
+    def parse(cls, output, prefix=""):
+        """ Parse status output, keeping the changes below `prefix` - the current directory within the repository """
+        entries = []
+        fields = output.split("\0")
+        i = 0
+        while i < len(fields):
+            field = fields[i]
+            i = i + 1
+            orig = None
+            if field.startswith("1 "):
+                status, path = field[2:4], field.split(" ", 8)[8]
+            elif field.startswith("2 "):
+                # renames and copies are followed by the original path
+                status, path, orig = field[2:4], field.split(" ", 9)[9], fields[i]
+                i = i + 1
+            elif field.startswith("u "):
+                status, path = field[2:4], field.split(" ", 10)[10]
+            elif field.startswith("? ") or field.startswith("! "):
+                status, path = field[0] * 2, field[2:]
+            else:
+                continue
+            if not path.startswith(prefix):
+                continue
+            if orig is not None:
+                orig = orig[len(prefix):] if orig.startswith(prefix) else None
+            entries.append((status.replace(".", " "), path[len(prefix):], orig))
+        return cls(entries)
+
+    def _range(self, path):
+        """ get the range of entries below path """
+        return (bisect.bisect_left(self.paths, path + "/"),
+                # `0` is the character following `/`
+                bisect.bisect_left(self.paths, path + "0"))
+
+    def _contains(self, path):
+        i = bisect.bisect_left(self.paths, path)
+        return i < len(self.paths) and self.paths[i] == path
+
+    def under(self, path):
+        """ Get the entries for path and the paths below it """
+        path = os.path.normpath(path)
+        if path == ".":
+            return list(self.entries)
+        lo, hi = self._range(path)
+        exact = [ x for x in self.entries[bisect.bisect_left(self.paths, path):lo] if x[1] == path ]
+        return exact + self.entries[lo:hi]
+
+    def is_dirty(self, path):
+        """ check if path, anything below it, or an untracked directory containing it has changed """
+        path = os.path.normpath(path)
+        if path == ".":
+            return len(self.paths) > 0
+        lo, hi = self._range(path)
+        return hi > lo or self._contains(path) or self.untracked_parent(path) is not None
+
+    def untracked_parent(self, path):
+        """ Get the untracked directory containing path, as reported by status, or None """
+        parent = os.path.dirname(os.path.normpath(path))
+        while len(parent) > 0:
+            if self._contains(parent + "/"):
+                return parent + "/"
+            parent = os.path.dirname(parent)
+        return None
+
+
+class PathPattern:
+    """ Glob style path pattern matched a path segment at a time
+
+    Matching a path advances a set of positions in the pattern segment by segment, so the state reached for a
+    folder tells both whether the folder itself matches and whether anything below it still could. Traversals
+    keep the state of each folder they queue and only descend into folders where a match remains possible.
+    """
+
+    def __init__(self, segments, directories_only=False):
+        """ :param segments: compiled regular expression for each segment of the pattern, or None for `**`
+            :param directories_only: if true, as for patterns ending with `/`, only folders match
+        """
+        self.segments = segments
+        self.directories_only = directories_only
+        self.start = self._closure([ 0 ])
+
+    def _closure(self, positions):
+        """ add the positions reached by `**` matching zero segments """
+        result = set()
+        positions = list(positions)
+        while len(positions) > 0:
+            i = positions.pop()
+            if i in result:
+                continue
+            result.add(i)
+            if i < len(self.segments) and self.segments[i] is None:
+                positions.append(i + 1)
+        return frozenset(result)
+
+    def step(self, state, name):
+        """ get the state after matching the next path segment `name` from `state` """
+        positions = []
+        for i in state:
+            if i >= len(self.segments):
+                continue
+            segment = self.segments[i]
+            if segment is None:
+                positions.append(i)
+            elif segment.match(name):
+                positions.append(i + 1)
+        return self._closure(positions)
+
+    def match_state(self, path):
+        """ get the state after matching the segments of relative path `path` """
+        state = self.start
+        for name in path.split("/"):
+            if len(name) > 0:
+                state = self.step(state, name)
+        return state
+
+    def is_match(self, state, is_dir=False):
+        """ check if a path reaching `state` matches the whole pattern """
+        return len(self.segments) in state and (is_dir or not self.directories_only)
+
+    def can_descend(self, state):
+        """ check if paths below a folder reaching `state` could match """
+        return any([ i < len(self.segments) for i in state ])
+
+
+class DaemonConnection:
+    """ Connection to a daemon client, shared by the streams of a forwarded command
+
+    Once a write fails, the client is considered gone: the connection is marked disconnected and every later
+    write raises `BrokenPipeError`, so that the command is aborted instead of running on without output.
+    """
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.lock = threading.Lock()
+        self.disconnected = False
+
+    def send(self, message):
+        """ send a json message to the client """
+        with self.lock:
+            if self.disconnected:
+                raise BrokenPipeError("daemon client disconnected")
+            try:
+                self.wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+            except OSError:
+                self.disconnected = True
+                raise
+
+
+class DaemonStream(io.TextIOBase):
+    """ Text stream sending what is written to a daemon client as json messages, a line at a time """
+
+    def __init__(self, connection, name):
+        self.connection = connection
+        self.name = name
+        self.buffer = ""
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        if self.connection.disconnected:
+            raise BrokenPipeError("daemon client disconnected")
+        self.buffer = self.buffer + s
+        if "\n" in s:
+            self.flush()
+        return len(s)
+
+    def flush(self):
+        if len(self.buffer) > 0:
+            data, self.buffer = self.buffer, ""
+            self.connection.send({ "stream": self.name, "data": data })
+
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    """ Handles a single request from a daemon client
+
+    A request is a json line holding either a command to run, with its arguments, working directory and
+    environment, or a `status` or `stop` control request. Command output is sent back as json lines, followed
+    by a final line with the exit code.
+    """
+
+    def handle(self):
+        line = self.rfile.readline()
+        if len(line) == 0:
+            return
+        request = json.loads(line)
+        server = self.server
+        control = request.get("control")
+        if control == "status":
+            reply = { "exit": 0, "status": { "pid": os.getpid(), "socket": server.server_address,
+                                             "uptime": round(time.time() - server.started, 1),
+                                             "commands": server.commands,
+                                             "profiles": sorted(server.sync.clients.keys()) } }
+        elif control == "stop":
+            server.stopping = True
+            reply = { "exit": 0 }
+        else:
+            server.commands = server.commands + 1
+            connection = DaemonConnection(self.wfile)
+            exit_code = server.sync.run_forwarded_command(request, connection)
+            if connection.disconnected:
+                return
+            reply = { "exit": exit_code }
+        try:
+            self.wfile.write((json.dumps(reply) + "\n").encode("utf-8"))
+        except OSError:
+            # the client went away, there is no one left to reply to
+            pass
+
+
+class DaemonServer(socketserver.UnixStreamServer):
+    """ Unix socket server running forwarded commands one at a time on a resident `DatabricksSync` instance """
+
+    def __init__(self, socket_path, sync):
+        self.sync = sync
+        self.started = time.time()
+        self.commands = 0
+        self.stopping = False
+        super().__init__(socket_path, DaemonRequestHandler)
+
+
 class DatabricksSync:
     """ Class to implement Git sync with workspace """
 
@@ -26,6 +1083,31 @@ class DatabricksSync:
         self.logger = logging.getLogger("DatabricksSync")
         self.program="databricks_sync"
         self.config={ "dummy":"test" }
+        self.jobs=1
+        self.client=None
+        self.clients={}
+        self.catalog=None
+        self.cache_ttl=0
+        self.refresh_cache=False
+        self.rate_limiter=None
+        self.retries=0
+        self.base_backoff=0.5
+        self.max_backoff=30.0
+        self.stats=None
+        self.config_mtime=None
+        self.git_status_index=None
+        self.engine=None
+
+    def reset(self):
+        """ Reset per command state, keeping connections, caches and configuration for the next command """
+        self.commands_to_execute=[]
+        self.jobs=1
+        self.client=None
+        self.rate_limiter=None
+        self.retries=0
+        self.stats=None
+        self.git_status_index=None
+        self.logger.setLevel(logging.NOTSET)
 
     def add_std_options(self, parser, group="Options"):
         group=parser.add_argument_group(group)
@@ -37,6 +1119,26 @@ class DatabricksSync:
                             action="store_true")
         group.add_argument("--profile", help="Profile to use when connecting to Databricks workspace"
                             )
+        group.add_argument("--jobs", "-j", help="Number of concurrent workspace operations (default: 8)",
+                            type=int, default=8)
+        group.add_argument("--transport", help="How to call the workspace API: via the `databricks` CLI or an in-process REST client",
+                            choices=["cli", "rest"])
+        group.add_argument("--engine", help="How to run concurrent commands: on a pool of threads or as asyncio coroutines",
+                            choices=["threads", "asyncio"])
+        group.add_argument("--retries", help="Number of times to retry throttled or failed workspace API calls (default: 5)",
+                            type=int, default=5)
+        group.add_argument("--max-rate", help="Maximum rate of workspace API calls per second",
+                            type=float, dest="max_rate")
+        group.add_argument("--stats", help="Write timing and counters for the run as json to file (`-` for stdout)",
+                            metavar="FILE")
+        group.add_argument("--trace", help="Write a Chrome trace event file of the run's phases and calls",
+                            metavar="FILE")
+        group.add_argument("--cache-ttl", help="Use cached workspace folder listings up to this many seconds old (default: 60)",
+                            type=float)
+        group.add_argument("--no-cache", help="Don't read or update the local workspace listing cache",
+                            action="store_true", dest="no_cache")
+        group.add_argument("--refresh", help="Refresh cached workspace listings instead of using them",
+                            action="store_true")
         group.add_argument("--help","-h",  help="Display help and exit.",
                             action="help")
 
@@ -45,10 +1147,12 @@ class DatabricksSync:
         return group
 
 
-    def parse_args(self):
+    def parse_args(self, argv=None):
         """ Parse args and set up instance properties
 
         This sets up the commands and their options
+
+        :param argv: arguments to parse - defaults to the command line arguments
         """
 
         description_text="""
@@ -92,7 +1196,7 @@ class DatabricksSync:
         parser_ls = subparsers.add_parser('ls',
                                           help="List contents of Databricks workspace folder",
                                           description="List contents of Databricks workspace folder location",
-                                          usage="{} ls [-d] [-v] [-l] [-R] [--absolute] path".format(self.program),
+                                          usage="{} ls [-d] [-v] [-l] [-R] [-s] [--absolute] path".format(self.program),
                                           conflict_handler='resolve', add_help=False,
                                           epilog=path_epilog,
                                           prog="Command [databricks_sync ls]"
@@ -105,13 +1209,15 @@ class DatabricksSync:
                                         action="store_true")
         group_args_options.add_argument("-R", "--recursive", help=recursive_prompt,
                                         action="store_true")
+        group_args_options.add_argument("-s", "--sort", help="sort objects by path before listing them",
+                                        action="store_true")
         group_args.add_argument("path", help="list objects from workspace path `path`")
 
         parser_diff = subparsers.add_parser('diff', help="Show differences between local filesystem and Databricks workspace folder",
                                           usage="{} diff [COMMAND-OPTIONS] src_path wksp_path".format(self.program),
                                           description="Show file level differences between local file system and databricks workspace folder location",
                                           conflict_handler='resolve', add_help=False,
-                                          epilog="Note: It does not compare file contents when a file exists in both databricks workspace and local file system",
+                                          epilog="Note: Unless `--content` is specified, it does not compare file contents when a file exists in both databricks workspace and local file system",
                                           prog="Command [databricks_sync diff]"
                                           )
         diff_args = parser_diff.add_argument_group("Arguments")
@@ -122,6 +1228,13 @@ class DatabricksSync:
                                         action="store_true")
         group_args_options.add_argument("-R", "--recursive", help=recursive_prompt,
                                         action="store_true")
+        group_args_options.add_argument("-c", "--content",
+                                        help="compare contents of local files with workspace notebooks in source format",
+                                        action="store_true")
+        group_args_options.add_argument("-u", "--unified", help="with `--content`, show unified diff of changed files",
+                                        action="store_true")
+        group_args_options.add_argument("--exit-code", help="with `--content`, exit with status 1 if there are differences",
+                                        action="store_true", dest="exit_code")
         diff_args.add_argument("src_path", help="local path for comparison")
         diff_args.add_argument("wksp_path", help="workspace path for comparison")
 
@@ -134,18 +1247,44 @@ class DatabricksSync:
         group_args2 = parser_export.add_argument_group("Arguments")
         group_export=self.add_std_options(parser_export, "Command Options")
 
-        group_args2.add_argument("wksp_path", help="Workspace path to get files from")
-        group_args2.add_argument("tgt_path", help="local path to place files in")
+        group_args2.add_argument("wksp_path", help="Workspace path to get files from", nargs="?")
+        group_args2.add_argument("tgt_path", help="local path to place files in", nargs="?")
 
         group_export.add_argument("-o", "--overwrite", help="overwrite local files if they exist",
                                  action="store_true")
-        group_export.add_argument("--format", help="format to use when downloading the files",
-                                 choices=["SOURCE", "DBC", "JUPYTER", "HTML", "source", "dbc", "jupyter", "html"],
-                                  required=True)
+        group_export.add_argument("--format", help="format to use when downloading the files. Required unless `--resume` is given",
+                                 choices=["SOURCE", "DBC", "JUPYTER", "HTML", "source", "dbc", "jupyter", "html"])
         group_export.add_argument("-R", "--recursive", help=recursive_prompt,
                                  action="store_true")
         group_export.add_argument( "--no-commit", help="Don't commit changes to local git",
                                   action="store_true", default=False)
+        group_export.add_argument("--bulk",
+                                  help="export the workspace folder as a single archive and unpack it locally (SOURCE and DBC formats)",
+                                  action="store_true", default=False)
+        group_export.add_argument("--stream",
+                                  help="start exporting notebooks while the workspace is still being listed",
+                                  action="store_true", default=False)
+        group_export.add_argument("--incremental",
+                                  help="only export notebooks changed since the last export. Needs `--transport rest` to detect changes",
+                                  action="store_true", default=False)
+        group_export.add_argument("--keep-going", help="keep executing remaining commands of a step when a command fails",
+                                  action="store_true", default=False)
+        group_export.add_argument("--resume",
+                                  help="continue the last interrupted export from its journal, skipping the commands that completed. Paths and other options are taken from the interrupted export",
+                                  action="store_true", default=False)
+        group_export.add_argument("--mirror",
+                                  help="make the local files mirror the workspace: export new and changed notebooks and remove the files exported from notebooks that no longer exist",
+                                  action="store_true", default=False)
+        group_export.add_argument("--max-delete", help="with `--mirror`, fail without changing anything if more than this many files would be removed (default: 100, -1 for no limit)",
+                                  type=int, default=100)
+        group_export.add_argument("--fast-import",
+                                  help="commit the exported notebooks to a branch through `git fast-import`, without writing them to the working tree",
+                                  action="store_true", default=False)
+        group_export.add_argument("--branch",
+                                  help="with `--fast-import`, the branch to commit to (default: the current branch, whose checkout is then brought up to date)")
+        group_export.add_argument("--fast-forward",
+                                  help="with `--fast-import` to another branch, fast forward the current checkout to it afterwards",
+                                  action="store_true", default=False)
         group_export.add_argument( "--push-to",
                                    help="Push changes to remote github. Use form : `--push-to remote/branch`",
                                   )
@@ -165,28 +1304,95 @@ class DatabricksSync:
                                               )
         group_args3 = parser_import.add_argument_group("Arguments")
         group_import=self.add_std_options(parser_import, "Command Options")
-        group_args3.add_argument("src_path", help="local path to take notebook files from ")
-        group_args3.add_argument("wksp_path", help="target workspace path")
+        group_args3.add_argument("src_path", help="local path to take notebook files from ", nargs="?")
+        group_args3.add_argument("wksp_path", help="target workspace path", nargs="?")
         group_import.add_argument("-o", "--overwrite", help="overwrite local files if they exist",
                                  action="store_true")
         group_import.add_argument("-f", "--force", help="force changes even if otherwise warnings or errors flagged",
                                  action="store_true")
+        group_import.add_argument("--keep-going", help="keep executing remaining commands of a step when a command fails",
+                                  action="store_true", default=False)
+        group_import.add_argument("--bulk",
+                                  help="pack the files into a single DBC archive and import it as the target folder",
+                                  action="store_true", default=False)
+        group_import.add_argument("--incremental",
+                                  help="only import files changed in git since the last import to the workspace path",
+                                  action="store_true", default=False)
+        group_import.add_argument("--delete",
+                                  help="with `--incremental`, remove notebooks for files deleted since the last import",
+                                  action="store_true", default=False)
+        group_import.add_argument("--resume",
+                                  help="continue the last interrupted import from its journal, skipping the commands that completed. Paths and other options are taken from the interrupted import",
+                                  action="store_true", default=False)
+        group_import.add_argument("--mirror",
+                                  help="make the workspace folder mirror the local files: import new and changed files and remove notebooks without a local file",
+                                  action="store_true", default=False)
+        group_import.add_argument("--max-delete", help="with `--mirror` or `--bulk --overwrite`, fail without changing anything if more than this many notebooks would be removed (default: 100, -1 for no limit)",
+                                  type=int, default=100)
         group_import.add_argument("-k", "--keep-extensions",
                                   help="keep source extensions when importing ",
                                  action="store_true", default=False)
         group_import.add_argument("-R", "--recursive", help=recursive_prompt,
                                  action="store_true")
-        group_import.add_argument("-l", "--language", help="base language for notebook",
-                                 choices=["SCALA", "PYTHON", "SQL", "R", "scala", "python", "sql", "r"],
-                                  required=True)
+        group_import.add_argument("-l", "--language", help="base language for notebook. Required unless `--resume` is given",
+                                 choices=["SCALA", "PYTHON", "SQL", "R", "scala", "python", "sql", "r"])
 
-        group_import.add_argument("--format", help="format to use when downloading the files",
-                                 choices=["SOURCE", "DBC", "JUPYTER", "HTML", "source", "dbc", "jupyter", "html"],
-                                  default="SOURCE")
+        group_import.add_argument("--format", help="format to use when downloading the files (default: SOURCE)",
+                                 choices=["SOURCE", "DBC", "JUPYTER", "HTML", "source", "dbc", "jupyter", "html"])
 
 
         #parser_push.set_defaults(func=self.pull)
 
+        watch_epilog="""
+        Changes are detected by polling the local file system. Files are imported as they are, without checking
+        that they are committed to git. Use `--transport rest` to keep a warm connection to the workspace.
+        For example :
+          databricks_sync watch -l PYTHON --transport rest "./**/*.py" "TestSync"
+        """
+        parser_watch = subparsers.add_parser('watch', help="Watch local files and import changes to Databricks workspace",
+                                             usage="{} watch [COMMAND-OPTIONS] src_path wksp_path".format(self.program),
+                                             description="Watch local notebook files and import them to a databricks workspace folder as they change",
+                                             conflict_handler='resolve', add_help=False,
+                                             epilog=watch_epilog, prog="Command [databricks_sync watch]")
+        group_args4 = parser_watch.add_argument_group("Arguments")
+        group_watch = self.add_std_options(parser_watch, "Command Options")
+        group_args4.add_argument("src_path", help="local path to take notebook files from ")
+        group_args4.add_argument("wksp_path", help="target workspace path")
+        group_watch.add_argument("-k", "--keep-extensions",
+                                 help="keep source extensions when importing ",
+                                 action="store_true", default=False)
+        group_watch.add_argument("-R", "--recursive", help=recursive_prompt,
+                                 action="store_true")
+        group_watch.add_argument("-l", "--language", help="base language for notebook",
+                                 choices=["SCALA", "PYTHON", "SQL", "R", "scala", "python", "sql", "r"],
+                                 required=True)
+        group_watch.add_argument("--format", help="format of the local files",
+                                 choices=["SOURCE", "DBC", "JUPYTER", "HTML", "source", "dbc", "jupyter", "html"],
+                                 default="SOURCE")
+        group_watch.add_argument("--delete", help="remove notebooks for files deleted or renamed locally",
+                                 action="store_true", default=False)
+        group_watch.add_argument("--interval", help="seconds between scans of the local files (default: 0.5)",
+                                 type=float, default=0.5)
+        group_watch.add_argument("--debounce",
+                                 help="seconds without further changes to wait before importing a batch of changes (default: 0.3)",
+                                 type=float, default=0.3)
+
+        daemon_epilog="""
+        While the daemon is running, the `ls`, `diff`, `export` and `import` commands are run by the daemon,
+        which keeps REST connections, the workspace listing cache and configuration loaded between commands.
+        Commands run one at a time, in the working directory and environment of the calling command.
+        Set DATABRICKS_SYNC_NO_DAEMON=1 to run a command in-process. Restart the daemon after changing profiles.
+        """
+        parser_daemon = subparsers.add_parser('daemon', help="Start, stop or show status of the background daemon",
+                                              usage="{} daemon [COMMAND-OPTIONS] {{start,stop,status,run}}".format(self.program),
+                                              description="Manage a background daemon running commands with warm connections and caches",
+                                              conflict_handler='resolve', add_help=False,
+                                              epilog=daemon_epilog, prog="Command [databricks_sync daemon]")
+        group_args5 = parser_daemon.add_argument_group("Arguments")
+        self.add_std_options(parser_daemon, "Command Options")
+        group_args5.add_argument("action", choices=["start", "stop", "status", "run"],
+                                 help="`run` runs the daemon in the foreground")
+
         parser_config = subparsers.add_parser('configure', help="Configure defaults for subsequent commands",
                                               description="Configure default settings for subsequent commands",
                                               usage="{} configure [COMMAND-OPTIONS] ".format(self.program),
@@ -194,77 +1400,557 @@ class DatabricksSync:
         group_config=self.add_std_options(parser_config, "Command Options")
         #parser_config.set_defaults(func=self.configure)
 
-        args = parser.parse_args()
+        args = parser.parse_args(argv)
+
+        # paths and formats of a resumed run come from its journal
+        if args.command in self.resumable_args and not args.resume:
+            missing = [ name for dest, name in self.resumable_args[args.command] if getattr(args, dest) is None ]
+            if len(missing) > 0:
+                subparsers.choices[args.command].error("the following arguments are required: {}".format(
+                    ", ".join(missing)))
+            if args.format is None:
+                args.format = "SOURCE"
 
         if args.verbose:
             self.logger.setLevel(logging.INFO)
-            self.logger.info("setting log level to INFO")
         if args.debug:
             self.logger.setLevel(logging.DEBUG)
-            self.logger.debug("setting log level to DEBUG")
-
-        self.logger.debug("args: %s", str(args))
 
         return parser, args
 
-    def add_command(self, cmd):
+    # phases of the execution plan, in order. Commands in a phase only depend on commands in earlier phases
+    # so commands within the phases listed in `parallel_phases` may be run concurrently. The `replace` phase
+    # holds removals that must only happen once everything they are replaced with has been prepared
+    phases = ["prepare", "replace", "transfer", "extract", "stage", "commit", "push"]
+    parallel_phases = ["prepare", "transfer", "extract"]
+
+    def command_phase(self, cmd):
+        """ determine the plan phase for a command """
+        if cmd[0] == "mkdir" or cmd[:3] == ["databricks", "workspace", "mkdirs"]:
+            return "prepare"
+        if cmd[:2] == [self.program, "pack"]:
+            return "prepare"
+        if cmd[:2] == [self.program, "unpack"]:
+            return "extract"
+        if cmd[0] == "git":
+            # first non option argument is the git sub command
+            git_command = next((x for x in cmd[1:] if not x.startswith("-")), None)
+            if git_command in ("add", "rm"):
+                return "stage"
+            if git_command == "commit":
+                return "commit"
+            if git_command == "push":
+                return "push"
+        return "transfer"
+
+    def add_command(self, cmd, phase=None):
         """ add command to set of commands to execute"""
         assert cmd is not None
+        if phase is None:
+            phase = self.command_phase(cmd)
+        assert phase in self.phases, "Unknown phase"
         self.logger.debug("adding command : %s", str(cmd))
-        self.commands_to_execute.append(cmd)
+        self.commands_to_execute.append((phase, cmd))
 
     def execute_cmd_ex(self, cmd):
         """ Execute a single command """
         assert type(cmd) is list, "Command must be list"
+        if self.engine is not None and not self.engine.in_loop():
+            return self.engine.submit(self.execute_cmd_async(cmd)).result()
         self.logger.info("Executing command [{}]".format(str(cmd)))
+        start = time.monotonic()
+        if cmd[:2] == ["databricks", "workspace"]:
+            exit_status, cmd_output = self._run_workspace_cmd(cmd)
+        else:
+            exit_status, cmd_output = self._run_cmd(cmd)
+
+        if self.stats is not None:
+            self.record_call_stats(cmd, exit_status, start)
+        self.logger.debug("Exit status is : %d", exit_status.returncode)
+        if self.catalog is not None and cmd[:2] == ["databricks", "workspace"] and exit_status.returncode == 0:
+            self.invalidate_catalog(cmd)
+        return (exit_status, cmd_output)
+
+    def command_resource(self, cmd):
+        """ get the resource a command uses, bounding its concurrency with the asyncio engine """
+        if cmd[:2] == ["databricks", "workspace"]:
+            return "api"
+        if cmd[0] == "git":
+            return "git"
+        return "disk"
+
+    async def execute_cmd_async(self, cmd):
+        """ Execute a single command as a coroutine on the asyncio engine """
+        assert type(cmd) is list, "Command must be list"
+        self.logger.info("Executing command [{}]".format(str(cmd)))
+        async with self.engine.semaphores[self.command_resource(cmd)]:
+            start = time.monotonic()
+            if cmd[:2] == ["databricks", "workspace"]:
+                exit_status, cmd_output = await self._run_workspace_cmd_async(cmd)
+            else:
+                exit_status, cmd_output = await self._run_cmd_async(cmd)
+
+        if self.stats is not None:
+            self.record_call_stats(cmd, exit_status, start)
+        self.logger.debug("Exit status is : %d", exit_status.returncode)
+        if self.catalog is not None and cmd[:2] == ["databricks", "workspace"] and exit_status.returncode == 0:
+            self.invalidate_catalog(cmd)
+        return (exit_status, cmd_output)
+
+    def phase(self, name):
+        """ context manager to time a phase of the run when collecting stats """
+        if self.stats is None:
+            return contextlib.nullcontext()
+        return self.stats.phase(name)
+
+    def record_call_stats(self, cmd, exit_status, start):
+        """ record latency and bytes transferred by a command """
+        if cmd[0] in ("databricks", "git", self.program):
+            kind = " ".join([ x for x in cmd[:3] if not x.startswith("-") ][:3 if cmd[0] == "databricks" else 2])
+        else:
+            kind = cmd[0]
+        failed = exit_status.returncode != 0
+        self.stats.record_call(kind, start, time.monotonic() - start, failed=failed)
+
+        if failed:
+            return
+        try:
+            if cmd[:3] == ["databricks", "workspace", "export"]:
+                self.stats.count("bytes_downloaded", os.path.getsize(cmd[-1]))
+            elif cmd[:3] == ["databricks", "workspace", "import"]:
+                self.stats.count("bytes_uploaded", os.path.getsize(cmd[-2]))
+            elif cmd[:3] == ["databricks", "workspace", "ls"]:
+                self.stats.count("bytes_downloaded", len(exit_status.stdout))
+        except OSError:
+            pass
+
+    def _run_cmd(self, cmd):
+        """ Run a command with the configured transport """
+        if self.client is not None and cmd[:2] == ["databricks", "workspace"]:
+            return self.client.execute(cmd)
+        elif cmd[0] == self.program:
+            return self.execute_internal_cmd(cmd)
+
+        if self.stats is not None:
+            self.stats.count("subprocesses")
         exit_status = subprocess.run(cmd,
                                      stdout=subprocess.PIPE, stderr=subprocess.PIPE,
                                      universal_newlines=True
                                      )
-
         cmd_output=str(exit_status.stdout).split('\n')
-        self.logger.debug("Exit status is : %d", exit_status.returncode)
-        return (exit_status, cmd_output)
+        return exit_status, cmd_output
+
+    async def _run_cmd_async(self, cmd):
+        """ Run a command with the configured transport, as a coroutine """
+        if self.client is not None and cmd[:2] == ["databricks", "workspace"]:
+            return await asyncio.to_thread(self.client.execute, cmd)
+        elif cmd[0] == self.program:
+            return await asyncio.to_thread(self.execute_internal_cmd, cmd)
+
+        if self.stats is not None:
+            self.stats.count("subprocesses")
+        proc = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE,
+                                                    stderr=asyncio.subprocess.PIPE)
+        stdout, stderr = await proc.communicate()
+        # decode as `universal_newlines` does for `subprocess.run`
+        stdout = stdout.decode().replace("\r\n", "\n")
+        stderr = stderr.decode().replace("\r\n", "\n")
+        exit_status = subprocess.CompletedProcess(cmd, proc.returncode, stdout=stdout, stderr=stderr)
+        return exit_status, stdout.split('\n')
+
+    # HTTP status in the error message of the `databricks` CLI, such as `Error: HTTPError: 503 Server Error: ...`,
+    # `Error: TEMPORARILY_UNAVAILABLE (503): ...` or `Error: ... status code 503`. Only the `Error:` prefix is
+    # searched, so that digits in the paths of the message are not taken for a status
+    re_cli_status = re.compile(r"^Error: (?:.*?\bHTTPError: (\d{3})\b|[A-Z_]+ \((\d{3})\):|.*?\bstatus(?: code)?:? (\d{3})\b)",
+                               re.MULTILINE)
+    # messages indicating failures of the `databricks` CLI that may succeed when retried
+    re_transient = re.compile(r"Too Many Requests|REQUEST_LIMIT_EXCEEDED|TEMPORARILY_UNAVAILABLE"
+                              r"|Service Unavailable|Connection ?(Error|reset|aborted|refused)|timed out", re.IGNORECASE)
+    re_throttled = re.compile(r"Too Many Requests|REQUEST_LIMIT_EXCEEDED|TEMPORARILY_UNAVAILABLE"
+                              r"|Service Unavailable", re.IGNORECASE)
+
+    def classify_failure(self, exit_status):
+        """ Classify a failed workspace command
+
+        :return: tuple of (transient, throttled)
+        """
+        http_status = getattr(exit_status, "http_status", None)
+        if http_status is None and self.client is None:
+            m_status = self.re_cli_status.search(exit_status.stderr or "")
+            if m_status is not None:
+                http_status = int([ x for x in m_status.groups() if x is not None ][0])
+        if http_status is not None:
+            return http_status in (429, 500, 502, 503, 504), http_status in (429, 503)
+        if self.client is not None:
+            return False, False
+        message = "{} {}".format(exit_status.stdout, exit_status.stderr)
+        return self.re_transient.search(message) is not None, self.re_throttled.search(message) is not None
+
+    def _run_workspace_cmd(self, cmd):
+        """ Run a workspace API command through the rate limiter, retrying transient failures
+
+        Retries use exponential backoff with full jitter. Only failures remaining after
+        `--retries` retries are returned.
+        """
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            throttled = False
+            try:
+                exit_status, cmd_output = self._run_cmd(cmd)
+                transient = False
+                if exit_status.returncode != 0:
+                    transient, throttled = self.classify_failure(exit_status)
+            finally:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.release(throttled)
+
+            if attempt > 0 and self.is_retried_success(cmd, exit_status):
+                return subprocess.CompletedProcess(cmd, 0, stdout=exit_status.stdout, stderr=""), cmd_output
+            delay = self.retry_delay(cmd, exit_status, transient, throttled, attempt)
+            if delay is None:
+                return exit_status, cmd_output
+            attempt = attempt + 1
+            time.sleep(delay)
+
+    async def _run_workspace_cmd_async(self, cmd):
+        """ Run a workspace API command as a coroutine, as `_run_workspace_cmd` does """
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire_async()
+            throttled = False
+            try:
+                exit_status, cmd_output = await self._run_cmd_async(cmd)
+                transient = False
+                if exit_status.returncode != 0:
+                    transient, throttled = self.classify_failure(exit_status)
+            finally:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.release(throttled)
+
+            if attempt > 0 and self.is_retried_success(cmd, exit_status):
+                return subprocess.CompletedProcess(cmd, 0, stdout=exit_status.stdout, stderr=""), cmd_output
+            delay = self.retry_delay(cmd, exit_status, transient, throttled, attempt)
+            if delay is None:
+                return exit_status, cmd_output
+            attempt = attempt + 1
+            await asyncio.sleep(delay)
+
+    def is_retried_success(self, cmd, exit_status):
+        """ check if a retried workspace command failed only because an earlier attempt succeeded
+
+        An attempt that failed with a transient error may still have been applied, so importing without
+        overwrite then finds the notebook and removing no longer finds the object.
+        """
+        if exit_status.returncode == 0:
+            return False
+        message = "{} {}".format(exit_status.stdout, exit_status.stderr)
+        if cmd[2] == "import" and "--overwrite" not in cmd and "-o" not in cmd:
+            succeeded = "RESOURCE_ALREADY_EXISTS" in message
+        elif cmd[2] in ("rm", "delete"):
+            succeeded = "RESOURCE_DOES_NOT_EXIST" in message
+        else:
+            return False
+        if succeeded:
+            self.logger.info("Retried command failed as an earlier attempt succeeded : %s", cmd)
+        return succeeded
+
+    def retry_delay(self, cmd, exit_status, transient, throttled, attempt):
+        """ Get the time to wait before retrying a workspace command, or None if it is not to be retried """
+        if exit_status.returncode == 0 or not transient or attempt >= self.retries:
+            return None
+
+        if self.stats is not None:
+            self.stats.count("retries")
+            self.stats.count("throttled", 1 if throttled else 0)
+        delay = random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+        self.logger.warning("Transient failure executing command (%s) - retry %d in %.1fs : %s",
+                            "throttled" if throttled else "error", attempt + 1, delay, cmd)
+        return delay
+
+    def execute_internal_cmd(self, cmd):
+        """ Execute a `databricks_sync ...` plan step in-process
+
+        Internal steps are kept in the plan as command lists so that they are shown by `--dry-run`
+        and scheduled along with the other commands.
+        """
+        parser = argparse.ArgumentParser(prog=self.program, add_help=False)
+        parser.add_argument("step", choices=["unpack", "pack"])
+        parser.add_argument("--format")
+        parser.add_argument("--language")
+        parser.add_argument("--pattern")
+        parser.add_argument("--file-list")
+        parser.add_argument("--recursive", action="store_true")
+        parser.add_argument("--overwrite", action="store_true")
+        parser.add_argument("paths", nargs="*")
+        step_args = parser.parse_intermixed_args(cmd[1:])
 
+        try:
+            if step_args.step == "unpack":
+                output = self.unpack_archive(step_args.paths[0], step_args.paths[1], step_args.format,
+                                             pattern=step_args.pattern, recursive=step_args.recursive,
+                                             overwrite=step_args.overwrite, file_list=step_args.file_list)
+            elif step_args.step == "pack":
+                output = self.pack_archive(step_args.paths[0], step_args.paths[1], step_args.language,
+                                           step_args.file_list)
+        except (RuntimeError, OSError, zipfile.BadZipFile) as err:
+            return subprocess.CompletedProcess(cmd, 1, stdout="", stderr=str(err)), []
+        return subprocess.CompletedProcess(cmd, 0, stdout="\n".join(output), stderr=""), output
+
+    def invalidate_catalog(self, cmd):
+        """ Invalidate cached listings for workspace paths changed by a command """
+        if cmd[2] in ("import", "mkdirs"):
+            self.catalog.invalidate(self.profile_to_use, cmd[-1])
+        elif cmd[2] in ("rm", "delete"):
+            self.catalog.invalidate(self.profile_to_use, cmd[-1], descendants=True)
+
+
+    def _execute_phase(self, cmds, parallel, keep_going, journal=None):
+        """ Execute commands for a single phase, returning the list of commands that failed
+
+        Removing a workspace object that no longer exists succeeds: an earlier failed or interrupted run may
+        already have removed it.
+
+        :param cmds: list of tuples of (index in plan, command)
+        :param journal: `RunJournal` to record the index of each command that completes in
+        """
+        failures = []
+
+        def check_result(index, cmd, cmd_stat, cmd_out):
+            if cmd_stat.returncode != 0 and cmd[:3] == ['databricks', 'workspace', 'rm'] \
+                    and "RESOURCE_DOES_NOT_EXIST" in cmd_stat.stderr:
+                self.logger.info("already removed: %s", cmd)
+            elif cmd_stat.returncode != 0:
+                self.logger.error("Error executing command : %s %s", cmd_out, cmd_stat.stderr)
+                failures.append(cmd)
+                if not keep_going:
+                    raise RuntimeError("Failure executing command : %s", cmd)
+                return
+            if journal is not None:
+                journal.append({ "done": index })
+
+        if parallel and self.engine is not None and len(cmds) > 1:
+            futures = { self.engine.submit(self.execute_cmd_async(cmd)): (index, cmd) for index, cmd in cmds }
+            try:
+                for future in as_completed(futures):
+                    cmd_stat, cmd_out = future.result()
+                    check_result(*futures[future], cmd_stat, cmd_out)
+            finally:
+                # on failure, don't start commands that are still waiting for their turn
+                for future in futures:
+                    future.cancel()
+            return failures
+
+        if not parallel or self.jobs <= 1 or len(cmds) <= 1:
+            for index, cmd in cmds:
+                cmd_stat, cmd_out = self.execute_cmd_ex(cmd)
+                check_result(index, cmd, cmd_stat, cmd_out)
+            return failures
 
-    def execute_cmds_ex(self, args):
-        """ Execute a group of commands """
+        executor = ThreadPoolExecutor(max_workers=self.jobs)
+        try:
+            futures = { executor.submit(self.execute_cmd_ex, cmd): (index, cmd) for index, cmd in cmds }
+            for future in as_completed(futures):
+                cmd_stat, cmd_out = future.result()
+                check_result(*futures[future], cmd_stat, cmd_out)
+        finally:
+            # on failure, don't start commands that have not yet been picked up
+            executor.shutdown(wait=True, cancel_futures=True)
+        return failures
+
+    def execute_cmds_ex(self, args, finish=None, journal_name=None):
+        """ Execute a group of commands
+
+        Commands are executed phase by phase. Within the `prepare` and `transfer` phases, up to `--jobs`
+        commands run concurrently. By default, the first failure stops execution; with `--keep-going`
+        all commands of the failing phase are attempted and the failures reported together.
+
+        :param finish: steps to complete the run with once all commands succeed, see `finish_run`
+        :param journal_name: if given, the plan and progress are recorded in the named journal, so that the run
+                             can be continued with `--resume` if interrupted
+        """
         if args.dryrun:
-            for cmd in self.commands_to_execute:
+            for phase, cmd in self.commands_to_execute:
                 print("Dryrun: Executing command [{}]".format(cmd))
-        else:
-            for cmd in self.commands_to_execute:
-                cmd_stat, cmd_out = self.execute_cmd_ex(cmd)
-                if cmd_stat.returncode != 0:
-                    self.logger.error("Error executing command : %s", cmd_out)
-                    raise RuntimeError("Failure executing command : %s", cmd)
+            return
+
+        journal = None
+        if journal_name is not None:
+            try:
+                journal = RunJournal(self.get_journal_path(journal_name))
+            except RuntimeError as err:
+                self.logger.warning("run can't be resumed if interrupted: %s", err)
+        if journal is not None:
+            records = journal.read()
+            if records is not None and len(records) > 0 and not records[-1].get("complete"):
+                self.logger.warning("discarding journal of interrupted %s - use `--resume` to continue it",
+                                    journal_name)
+            journal.create({ "plan": self.commands_to_execute, "cwd": os.getcwd(), "finish": finish,
+                             "args": dict([ (dest, getattr(args, dest))
+                                            for dest, name in self.resumable_args.get(journal_name, []) ]) })
+        try:
+            self.run_plan(args, finish, journal)
+        finally:
+            if journal is not None:
+                journal.close()
+
+    def run_plan(self, args, finish=None, journal=None, done=None):
+        """ Execute the commands of the plan phase by phase, skipping those whose index is in `done` """
+        done = done or set()
+        keep_going = getattr(args, "keep_going", False)
+        for phase in self.phases:
+            cmds = [ (i, cmd) for i, (cmd_phase, cmd) in enumerate(self.commands_to_execute)
+                     if cmd_phase == phase and i not in done ]
+            if len(cmds) == 0:
+                continue
+            if phase == "commit" and journal is not None:
+                # a commit that completes without being recorded is recognized by the change of HEAD
+                journal.append({ "head": self.get_head() })
+            self.logger.info("executing %d commands for phase [%s]", len(cmds), phase)
+            with self.phase(phase):
+                failures = self._execute_phase(cmds, phase in self.parallel_phases, keep_going, journal)
+            if len(failures) > 0:
+                raise RuntimeError("Failure executing {} commands in phase [{}]: {}".format(len(failures),
+                                                                                          phase, failures))
+        self.finish_run(finish)
+        if journal is not None:
+            journal.append({ "complete": True })
+
+    def finish_run(self, finish):
+        """ Complete a run once its commands have succeeded
+
+        :param finish: dictionary of the steps to take - `manifest` (list of exports) and `format` to update the
+                       export manifest, and `import` (workspace path and local path) to record an import
+        """
+        if finish is None:
+            return
+        if "manifest" in finish:
+            self.update_manifest(finish["manifest"], finish["format"])
+        if "import" in finish:
+            self.record_import(*finish["import"])
+
+    def get_head(self):
+        """ get the commit of HEAD, or None if there is none """
+        git_stat, git_out = self.execute_cmd_ex(["git", "rev-parse", "--verify", "-q", "HEAD"])
+        return git_out[0].strip() if git_stat.returncode == 0 and len(git_out) > 0 else None
+
+    # arguments of each resumable command that are recorded in its journal, as (dest, name in messages).
+    # They may be omitted with `--resume`, but must not conflict with those of the interrupted run
+    resumable_args = { "export": [ ("wksp_path", "wksp_path"), ("tgt_path", "tgt_path"), ("format", "--format") ],
+                       "import": [ ("src_path", "src_path"), ("wksp_path", "wksp_path"), ("language", "-l/--language"),
+                                   ("format", "--format") ] }
+
+    def get_journal_path(self, name):
+        """ get the path of the journal of runs of command `name` in the current repository """
+        return os.path.join(self.get_sync_state_dir(), "journal_{}.jsonl".format(name))
+
+    def mk_resumed_command(self, cmd):
+        """ adjust a command that may have completed before a run was interrupted, so that it can run again """
+        if cmd[:3] in (['databricks', 'workspace', 'export'], ['databricks', 'workspace', 'import']) \
+                and "--overwrite" not in cmd:
+            return cmd[:3] + [ "--overwrite" ] + cmd[3:]
+        return cmd
+
+    def resume_run(self, args, name):
+        """ Resume the last interrupted run of command `name` from its journal
+
+        Commands recorded as complete are skipped. The others are run again, adjusted by `mk_resumed_command`
+        as they may have completed without being recorded, followed by the steps to finish the run.
+        """
+        journal = RunJournal(self.get_journal_path(name))
+        records = journal.read()
+        if records is None or len(records) == 0 or records[-1].get("complete"):
+            print("No interrupted {} to resume".format(name))
+            return
+        header = records[0]
+        if header["cwd"] != os.getcwd():
+            raise RuntimeError("Interrupted {} was run from {} - resume it from there".format(name, header["cwd"]))
+        for dest, arg_name in self.resumable_args.get(name, []):
+            recorded, given = header.get("args", {}).get(dest), getattr(args, dest)
+            if given is not None and recorded is not None and \
+                    (given.upper() != recorded.upper() if dest in ("format", "language") else given != recorded):
+                raise RuntimeError("Interrupted {} has {} [{}], not [{}] - omit it to resume".format(name, arg_name,
+                                                                                                   recorded, given))
+            if recorded is not None:
+                setattr(args, dest, recorded)
+
+        plan = [ tuple(x) for x in header["plan"] ]
+        done = set([ x["done"] for x in records if "done" in x ])
+        heads = [ x["head"] for x in records if "head" in x ]
+        if len(heads) > 0 and heads[-1] != self.get_head():
+            done.update([ i for i, (phase, cmd) in enumerate(plan) if phase == "commit" ])
+        self.commands_to_execute = [ (phase, cmd if i in done else self.mk_resumed_command(cmd))
+                                     for i, (phase, cmd) in enumerate(plan) ]
+        print("resuming {}: {} of {} commands already done".format(name, len(done), len(plan)))
+
+        if args.dryrun:
+            for i, (phase, cmd) in enumerate(self.commands_to_execute):
+                if i not in done:
+                    print("Dryrun: Executing command [{}]".format(cmd))
+            return
+        journal.open()
+        try:
+            self.run_plan(args, header.get("finish"), journal, done)
+        finally:
+            journal.close()
+
+    def get_git_status_index(self):
+        """ Get the index of local changes, running `git status` once per command """
+        if self.git_status_index is None:
+            with self.phase("git_status"):
+                prefix_stat, prefix_out = self.execute_cmd_ex(["git", "rev-parse", "--show-prefix"])
+                if prefix_stat.returncode != 0:
+                    raise RuntimeError("git status failed: {}".format(prefix_stat.stderr))
+                git_status, git_status_out = self.execute_cmd_ex(["git", "status", "--porcelain=v2", "-z",
+                                                                  "--untracked-files=normal"])
+            if git_status.returncode != 0:
+                raise RuntimeError("git status failed: {}".format(git_status.stderr))
+            self.git_status_index = GitStatusIndex.parse(git_status.stdout, prefix_out[0].strip())
+        return self.git_status_index
 
     def get_modified_or_untracked_changes(self, filepath, recursive=False, modified_only=False):
         """Gets the sets of files in the current directory or lower that have been modiifed
-        since last checkin or are untracked"""
-
-        git_status,git_status_out = self.execute_cmd_ex(["git", "status", "-s", "-u", "normal", filepath])
+        since last checkin or are untracked
 
-        if git_status.returncode != 0:
-            raise RuntimeError("git status failed")
-
-        # get the git status where if impacts files in current or lower directories
-        modified_files = [ y
-                           for y in [ (x[:2], x[2:].strip()) for x in list(git_status_out)]
-                           if not y[1].startswith("..") and len(y[1]) > 0]
-
-        # by default, git status is recursive
-        if modified_only:
-            modified_files = list(filter(lambda x: "??" != x[0], modified_files))
-
-        if recursive:
-            return modified_files
-        else:
-            return list(filter(lambda x: "/" not  in x[1], modified_files))
+        :param filepath: path or path pattern of the files to check
+        :param recursive: if false, only check files in the directory of `filepath`
+        :return: list of tuples of (short format status, path relative to the current directory)
+        """
+        index = self.get_git_status_index()
+        if os.path.isabs(filepath):
+            filepath = os.path.relpath(filepath)
+        pattern = None
+        root = filepath
+        if self.has_magic(filepath):
+            pattern = self.compile_path_pattern(filepath)
+            root = self.get_local_root(filepath)
+        root = os.path.normpath(root)
+
+        # untracked directories are reported as a whole, so files below one are untracked
+        untracked_parent = index.untracked_parent(root)
+        if untracked_parent is not None:
+            return [] if modified_only else [ ("??", untracked_parent) ]
+        if not index.is_dirty(root):
+            return []
+
+        modified_files = []
+        for status, path, orig in index.under(root):
+            if not recursive and "/" in (path if root == "." else path[len(root) + 1:]):
+                continue
+            # untracked directories are included as they may hold matching files
+            if pattern is not None and not path.endswith("/") and not pattern.match(path) \
+                    and not (orig is not None and pattern.match(orig)):
+                continue
+            if modified_only and status == "??":
+                continue
+            modified_files.append((status, path))
+        return modified_files
 
     def mk_local_file_from_notebook(self, path, language, format):
         """ Determine extension based on path, language and format"""
-        language_mappings = { "R" : '.r', "PYTHON" : ".py", "SCALA" : ".scala"}
+        language_mappings = { "R" : '.r', "PYTHON" : ".py", "SCALA" : ".scala", "SQL" : ".sql"}
         output = path
         if format == "DBC":
             output= path + ".dbc"
@@ -288,6 +1974,28 @@ class DatabricksSync:
                 .replace("*", r"\\*")
                 )
 
+    def mk_git_add_commands(self, files, max_args_len=32000):
+        """ Make commands to stage files in as few `git add` invocations as possible
+
+        File names are passed as separate arguments without a shell, and as literal pathspecs, so names
+        containing spaces, parentheses or wildcard characters do not need escaping.
+        Files are split across commands to keep each command line under `max_args_len` characters.
+        """
+        return self.mk_batched_commands(['git', '--literal-pathspecs', 'add', '--'], files, max_args_len)
+
+    def mk_batched_commands(self, cmd_base, files, max_args_len=32000):
+        """ Make commands of `cmd_base` followed by as many of `files` as fit in `max_args_len` characters """
+        cmds = []
+        cmd, cmd_len = None, 0
+        for f in files:
+            if cmd is None or cmd_len + len(f) + 1 > max_args_len:
+                cmd = list(cmd_base)
+                cmd_len = sum([ len(x) + 1 for x in cmd_base])
+                cmds.append(cmd)
+            cmd.append(f)
+            cmd_len = cmd_len + len(f) + 1
+        return cmds
+
     def export_from_workspace(self, args):
         """ Exports will grab notebooks from remote databricks workspace and
             check them into local git
@@ -298,6 +2006,10 @@ class DatabricksSync:
         self.logger.debug("starting export")
         self.get_params(args)
 
+        if args.resume:
+            self.resume_run(args, "export")
+            return
+
         remote = ["", ""]
         if args.push_to is not None:
             assert args.no_commit == False, "Cannot have option --no-commit with option --push-to"
@@ -328,62 +2040,402 @@ class DatabricksSync:
                                 str(modified_files))
             raise RuntimeError("There are uncommitted changes : {}".format(str(modified_files)))
 
-        # determine files to export from workspace
-        basePath, baseName= os.path.split(args.wksp_path)
-        match_pattern=""
+        # determine files to export from workspace - the folder before any wildcards and the pattern below it
+        wksp_path = self.mk_workspace_path(args.wksp_path)
+        effective_path, match_pattern, _ = self.split_workspace_pattern(wksp_path)
 
-        if self.has_magic(baseName):
-            match_pattern=baseName
-            effective_path = self.mk_workspace_path(basePath)
+        if match_pattern is not None:
             self.logger.info("Retrieving workspace files path [%s] pattern [%s]",
                               effective_path, match_pattern)
         else:
-            effective_path = self.mk_workspace_path(args.wksp_path)
+            match_pattern = ""
             self.logger.info("Retrieving workspace files path [%s]", effective_path)
 
 
-        wksp_contents = self.get_workspace_listing(effective_path, extended=True,
-                                                   absolute_paths=False,
-                                                   recursive=args.recursive,
-                                                   showProgress=False,
-                                                   omit_dirs=True)
-
-        # Get the set of folders that need to be created
-        new_folders = set([y for y in  [ os.path.dirname(x[2]) for x in wksp_contents]
-                       if y is not None and len(y) > 0])
+        if args.mirror and (args.bulk or args.stream):
+            raise ValueError("Cannot have option --mirror with options --bulk or --stream")
+        if args.bulk and args.stream:
+            raise ValueError("Cannot have option --stream with option --bulk")
+
+        if args.fast_import:
+            if args.bulk or args.stream or args.incremental or args.mirror:
+                raise ValueError("Cannot have option --fast-import with options --bulk, --stream, --incremental or --mirror")
+            if args.no_commit:
+                raise ValueError("Cannot have option --no-commit with option --fast-import, which only commits")
+            self.fast_import_export(args, wksp_path, effective_path, remote)
+            return
+
+        if args.bulk:
+            self.bulk_export_from_workspace(args, effective_path, match_pattern, remote)
+            return
+
+        # incremental exports need current modification times, so don't use cached listings
+        if args.incremental or args.mirror:
+            self.refresh_cache = True
+
+        # mirrors skip notebooks unchanged since the last export and replace the local files of the others
+        manifest = self.load_manifest() if args.incremental or args.mirror else {}
+        if args.mirror:
+            args.overwrite = True
+        exported = []
+        skipped = []
+        removed = []
+
+        if args.stream:
+            with self.phase("transfer"):
+                self.stream_export_from_workspace(args, wksp_path, effective_path, manifest, exported, skipped)
+        else:
+            wksp_contents = self.get_workspace_listing(wksp_path, extended=True,
+                                                       absolute_paths=False,
+                                                       recursive=args.recursive,
+                                                       showProgress=False,
+                                                       omit_dirs=True)
+
+            if args.mirror:
+                wksp_contents, removed = self.plan_mirror_export(args, effective_path, match_pattern, wksp_contents,
+                                                                 manifest)
+
+            # Get the set of folders that need to be created
+            new_folders = set([y for y in  [ os.path.dirname(x[2]) for x in wksp_contents]
+                           if y is not None and len(y) > 0])
+
+            # ... and add commands to make them
+            for new_folder in new_folders:
+                cmd=[ 'mkdir', '-p', new_folder ]
+                self.add_command(cmd)
+            self.logger.info("folders to create: %s", new_folders)
+
+            # get set of files to export
+            for x in wksp_contents:
+                cmd = self.mk_notebook_export_command(args, x, effective_path, manifest, exported, skipped)
+                if cmd is not None:
+                    self.add_command(cmd)
+
+        files_to_stage = [ x[1] for x in exported ]
+
+        if args.incremental or args.mirror:
+            print("{} notebooks to export, {} unchanged notebooks skipped".format(len(exported), len(skipped)))
+            if len(exported) == 0 and len(removed) == 0:
+                return
+
+        # add commands to stage exported files in bulk
+        for cmd in self.mk_git_add_commands(files_to_stage):
+            self.add_command(cmd)
 
-        # ... and add commands to make them
-        for new_folder in new_folders:
-            cmd=[ 'mkdir', '-p', new_folder ]
+        # ... and to remove the local files of notebooks that no longer exist and stage their removal
+        for cmd in self.mk_batched_commands(['rm', '-f', '--'], removed):
+            self.add_command(cmd)
+        for cmd in self.mk_batched_commands(['git', '--literal-pathspecs', 'rm', '-q', '--cached', '--ignore-unmatch',
+                                             '--'], removed):
             self.add_command(cmd)
-        self.logger.info("folders to create: %s", new_folders)
 
-        # get set of files to export
-        for x in wksp_contents:
-            src_path=x[2]
-            tgt_file = self.mk_local_file_from_notebook(x[2], x[3], args.format)
-            print(" +++ {}".format(tgt_file))
+        self.add_commit_commands(args, remote)
 
-            if os.path.exists(tgt_file) and not args.overwrite:
-                self.logger.error("File exists [%s] - specify `--overwrite` to overwrite it", tgt_file)
-                raise RuntimeError("Export would replace existing file and `--overwrite` was not specified")
+        self.execute_cmds_ex(args, finish={ "manifest": exported + skipped, "format": args.format },
+                             journal_name="export")
 
-            # add command to export notebook to file
-            cmd = ['databricks', 'workspace', 'export' , '--profile', self.profile_to_use ]
+        return
 
-            if args.overwrite:
-                cmd.append("--overwrite")
-            cmd.extend([ "--format", args.format,
-                         self.mk_workspace_path(effective_path, src_path),
-                         tgt_file])
+    def fast_import_export(self, args, wksp_path, effective_path, remote):
+        """ Export notebooks as a single commit on a branch, streamed through `git fast-import`
 
-            self.add_command(cmd)
+        Notebooks are exported concurrently to temporary files, and each is streamed to `git fast-import` as a
+        blob and removed as soon as its export completes. A commit on top of the branch, or of HEAD for a new branch,
+        then records the blobs at the paths a regular export would write, so the working tree and index are not
+        used. If the branch is checked out, the checkout is then updated to the commit with `git read-tree`.
+        A commit that changes nothing is dropped. As with a regular export, `--push-to` pushes the branch.
+        """
+        format = args.format.upper()
+        git_stat, git_out = self.execute_cmd_ex(["git", "symbolic-ref", "-q", "--short", "HEAD"])
+        current_branch = git_out[0].strip() if git_stat.returncode == 0 and len(git_out) > 0 else None
+        branch = args.branch or current_branch
+        if branch is None:
+            raise ValueError("HEAD is detached - specify the branch to commit to with `--branch`")
+        ref = "refs/heads/" + branch
+        git_stat, git_out = self.execute_cmd_ex(["git", "rev-parse", "-q", "--verify", ref + "^{commit}"])
+        old = git_out[0].strip() if git_stat.returncode == 0 else None
+        parent = old or self.get_head()
+        git_stat, git_out = self.execute_cmd_ex(["git", "rev-parse", "--show-prefix"])
+        prefix = git_out[0].strip() if len(git_out) > 0 else ""
+
+        wksp_contents = self.get_workspace_listing(wksp_path, extended=True, absolute_paths=False,
+                                                   recursive=args.recursive, omit_dirs=True)
+        notebooks = [ (self.mk_workspace_path(effective_path, x[2]),
+                       os.path.normpath(prefix + self.mk_local_file_from_notebook(x[2], x[3], format)))
+                      for x in wksp_contents ]
+        print("{} notebooks to commit to branch {}".format(len(notebooks), branch))
+        if args.dryrun:
+            for wksp_file, repo_path in notebooks:
+                print("Dryrun: fast-import [{}] as [{}]".format(wksp_file, repo_path))
+            return
 
-            # add command to add file
-            cmd = ['git', 'add',  """{}""".format(tgt_file) ]
-            self.add_command(cmd)
+        tmp_dir = tempfile.mkdtemp(prefix="databricks_sync_")
+        fast_import = subprocess.Popen(["git", "fast-import", "--quiet", "--date-format=raw"], stdin=subprocess.PIPE)
+        committed = False
+        try:
+            with self.phase("transfer"):
+                export_cmds = [ ['databricks', 'workspace', 'export', '--profile', self.profile_to_use,
+                                 '--format', format, wksp_file, os.path.join(tmp_dir, str(i))]
+                                for i, (wksp_file, repo_path) in enumerate(notebooks) ]
+                execute = self.execute_cmd_ex if self.engine is None else self.execute_cmd_async
+                failures = []
+                for cmd, result in self.bounded_map(execute, export_cmds):
+                    cmd_stat, cmd_out = result
+                    if cmd_stat.returncode != 0:
+                        self.logger.error("Error executing command : %s %s", cmd_out, cmd_stat.stderr)
+                        failures.append(cmd)
+                        if not args.keep_going:
+                            raise RuntimeError("Failure executing command : %s", cmd)
+                        continue
+                    # blobs are marked with the index of their notebook, plus one as mark 0 is not allowed
+                    tmp_file = cmd[-1]
+                    print(" +++ {}".format(notebooks[int(os.path.basename(tmp_file))][1]))
+                    fast_import.stdin.write("blob\nmark :{}\ndata {}\n".format(
+                        int(os.path.basename(tmp_file)) + 1, os.path.getsize(tmp_file)).encode("utf-8"))
+                    with open(tmp_file, "rb") as f:
+                        shutil.copyfileobj(f, fast_import.stdin)
+                    fast_import.stdin.write(b"\n")
+                    os.unlink(tmp_file)
+                if len(failures) > 0:
+                    raise RuntimeError("Failure executing {} commands in phase [transfer]: {}".format(len(failures),
+                                                                                                    failures))
+
+            with self.phase("commit"):
+                git_stat, git_out = self.execute_cmd_ex(["git", "var", "GIT_COMMITTER_IDENT"])
+                if git_stat.returncode != 0:
+                    raise RuntimeError("Could not determine committer: {}".format(git_stat.stderr))
+                message = "commited changes exported from workspace\n".encode("utf-8")
+                commit = "commit {}\ncommitter {}\ndata {}\n".format(ref, git_out[0].strip(), len(message))
+                fast_import.stdin.write(commit.encode("utf-8") + message)
+                if parent is not None:
+                    fast_import.stdin.write("from {}\n".format(parent).encode("utf-8"))
+                for i, (wksp_file, repo_path) in enumerate(notebooks):
+                    fast_import.stdin.write("M 100644 :{} {}\n".format(i + 1, self.fast_import_path(repo_path))
+                                            .encode("utf-8"))
+                fast_import.stdin.close()
+                committed = True
+                if fast_import.wait() != 0:
+                    raise RuntimeError("git fast-import failed with status {}".format(fast_import.returncode))
+        finally:
+            if not committed:
+                # without a commit, fast-import leaves the branch unchanged
+                with contextlib.suppress(BrokenPipeError):
+                    fast_import.stdin.close()
+                fast_import.wait()
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        git_stat, git_out = self.execute_cmd_ex(["git", "rev-parse", ref])
+        new = git_out[0].strip()
+        if parent is not None and self.is_same_tree(parent, new):
+            print("no changes exported - branch {} unchanged".format(branch))
+            restore = ["git", "update-ref", ref, old, new] if old is not None else ["git", "update-ref", "-d", ref, new]
+            self.execute_cmd_ex(restore)
+            return
+
+        if branch == current_branch:
+            update = [ "git", "read-tree", "-m", "-u" ] + ([ old ] if old is not None else []) + [ new ]
+        elif args.fast_forward and branch != current_branch:
+            update = ["git", "merge", "-q", "--ff-only", new]
+        else:
+            update = None
+        if update is not None:
+            git_stat, git_out = self.execute_cmd_ex(update)
+            if git_stat.returncode != 0:
+                raise RuntimeError("Committed {} to branch {} but could not update the checkout: {}".format(
+                    new[:10], branch, git_stat.stderr))
+        print("committed {} to branch {}".format(new[:10], branch))
+
+        if args.push_to is not None:
+            cmd = ['git', 'push', remote[0], "{}:{}".format(ref, remote[1])]
+            git_stat, git_out = self.execute_cmd_ex(cmd)
+            if git_stat.returncode != 0:
+                raise RuntimeError("Failure executing command : {} {}".format(cmd, git_stat.stderr))
+
+    def is_same_tree(self, commit1, commit2):
+        """ check if two commits have the same tree """
+        git_stat, git_out = self.execute_cmd_ex(["git", "rev-parse", commit1 + "^{tree}", commit2 + "^{tree}"])
+        return git_stat.returncode == 0 and len(git_out) >= 2 and git_out[0] == git_out[1]
+
+    def fast_import_path(self, path):
+        """ quote path for a `git fast-import` file command, if needed """
+        if path.startswith('"') or "\n" in path:
+            return '"{}"'.format(path.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        return path
 
+    def mk_notebook_export_command(self, args, x, effective_path, manifest, exported, skipped):
+        """ Make command to export a notebook from a workspace listing entry
+
+        Notebooks to export are added to `exported`, and unchanged notebooks skipped by an
+        incremental export are added to `skipped`, as tuples of (workspace path, local file, object info)
+
+        :return: export command, or None if the notebook is skipped
+        """
+        src_path=x[2]
+        tgt_file = self.mk_local_file_from_notebook(x[2], x[3], args.format)
+        wksp_file = self.mk_workspace_path(effective_path, src_path)
+
+        # when incremental, skip notebooks that have not changed since the last export
+        previous = manifest.get(wksp_file)
+        tracked = previous is not None and self.is_unchanged_local_file(tgt_file, previous, args.format)
+        if tracked and self.is_unchanged_notebook(x[4], previous):
+            print(" === {}".format(tgt_file))
+            skipped.append((wksp_file, tgt_file, x[4]))
+            return None
+
+        print(" +++ {}".format(tgt_file))
+
+        if os.path.exists(tgt_file) and not args.overwrite and not tracked:
+            self.logger.error("File exists [%s] - specify `--overwrite` to overwrite it", tgt_file)
+            raise RuntimeError("Export would replace existing file and `--overwrite` was not specified")
+
+        # add command to export notebook to file
+        cmd = ['databricks', 'workspace', 'export' , '--profile', self.profile_to_use ]
+
+        if args.overwrite or tracked:
+            cmd.append("--overwrite")
+        cmd.extend([ "--format", args.format,
+                     self.mk_workspace_path(effective_path, src_path),
+                     tgt_file])
+
+        exported.append((wksp_file, tgt_file, x[4]))
+        return cmd
+
+    def stream_export_from_workspace(self, args, wksp_path, effective_path, manifest, exported, skipped):
+        """ Export notebooks while the workspace is being listed
+
+        Export commands are run as soon as notebooks are listed, rather than after the whole listing has
+        been read. Listing only proceeds while there is room for more exports in flight, so memory use
+        stays bounded for large trees. Staging, commit and push are left to the regular plan.
+        """
+        folders_created = set()
+
+        def export_commands():
+            for x in self.iter_workspace_listing(wksp_path, extended=True, absolute_paths=False,
+                                                 recursive=args.recursive, omit_dirs=True):
+                # local folders are made before any export into them is started
+                new_folder = os.path.dirname(x[2])
+                if len(new_folder) > 0 and new_folder not in folders_created:
+                    folders_created.add(new_folder)
+                    cmd = [ 'mkdir', '-p', new_folder ]
+                    if args.dryrun:
+                        print("Dryrun: Executing command [{}]".format(cmd))
+                    else:
+                        cmd_stat, cmd_out = self.execute_cmd_ex(cmd)
+                        if cmd_stat.returncode != 0:
+                            raise RuntimeError("Failure executing command : %s", cmd)
+                cmd = self.mk_notebook_export_command(args, x, effective_path, manifest, exported, skipped)
+                if cmd is not None:
+                    yield cmd
+
+        if args.dryrun:
+            for cmd in export_commands():
+                print("Dryrun: Executing command [{}]".format(cmd))
+            return
+
+        failures = []
+        execute = self.execute_cmd_ex if self.engine is None else self.execute_cmd_async
+        for cmd, result in self.bounded_map(execute, export_commands()):
+            cmd_stat, cmd_out = result
+            if cmd_stat.returncode != 0:
+                self.logger.error("Error executing command : %s %s", cmd_out, cmd_stat.stderr)
+                failures.append(cmd)
+                if not getattr(args, "keep_going", False):
+                    raise RuntimeError("Failure executing command : %s", cmd)
+        if len(failures) > 0:
+            raise RuntimeError("Failure executing {} commands in phase [transfer]: {}".format(len(failures), failures))
 
+    def plan_mirror(self, source, target):
+        """ Plan the changes that make target mirror source, merging the two listings in a single pass
+
+        :param source: list of tuples of (key, item), sorted by key
+        :param target: list of tuples of (key, item), sorted by key
+        :return: tuple of (creates, updates, deletes) - lists of source items missing from target, of tuples of
+                 (source item, target item) with the same key, and of target items missing from source
+        """
+        creates, updates, deletes = [], [], []
+        i, j = 0, 0
+        while i < len(source) or j < len(target):
+            if j >= len(target) or (i < len(source) and source[i][0] < target[j][0]):
+                creates.append(source[i][1])
+                i = i + 1
+            elif i >= len(source) or target[j][0] < source[i][0]:
+                deletes.append(target[j][1])
+                j = j + 1
+            else:
+                updates.append((source[i][1], target[j][1]))
+                i = i + 1
+                # several source items may map to the same target
+                if i >= len(source) or source[i][0] != target[j][0]:
+                    j = j + 1
+        return creates, updates, deletes
+
+    def check_mirror_deletes(self, args, deletes):
+        """ list the objects a mirror or an overwrite removes, failing if there are more than `--max-delete` of them """
+        for x in deletes:
+            print(" --- {}".format(x))
+        if args.max_delete >= 0 and len(deletes) > args.max_delete:
+            raise RuntimeError("Would remove {} objects, more than `--max-delete` {} - nothing was changed"
+                               .format(len(deletes), args.max_delete))
+
+    def get_mirrored_local_files(self, args, effective_path, match_pattern, manifest):
+        """ Get the local files a mirror export may remove
+
+        These are the existing files below `tgt_path` that the manifest records as exported, in the export
+        format, from notebooks of the workspace path that match the pattern. Other local files are never removed.
+
+        :return: dictionary of local file, relative to the current directory, to its manifest entry
+        """
+        tgt_path = args.tgt_path
+        root = os.path.normpath(self.get_local_root(tgt_path) if self.has_magic(tgt_path) else tgt_path)
+        if os.path.isabs(root):
+            root = os.path.relpath(root)
+        pattern = self.compile_segment_pattern(match_pattern or "*", recursive=args.recursive)
+        prefix = effective_path.rstrip("/") + "/"
+
+        local_files = {}
+        for wksp_file, entry in manifest.items():
+            if not wksp_file.startswith(prefix) or entry.get("format") != args.format.upper():
+                continue
+            if not pattern.is_match(pattern.match_state(wksp_file[len(prefix):])):
+                continue
+            local_file = os.path.relpath(entry.get("local_file", ""))
+            if root != "." and local_file != root and not local_file.startswith(root + "/"):
+                continue
+            if local_file.startswith("../") or not os.path.isfile(local_file):
+                continue
+            local_files[local_file] = entry
+        return local_files
+
+    def plan_mirror_export(self, args, effective_path, match_pattern, wksp_contents, manifest):
+        """ Plan an export that makes the local files mirror the workspace listing
+
+        Local files exported from the workspace path by earlier exports are merged with the notebooks by local
+        file name. Notebooks are all kept for export, as unchanged ones are skipped using the manifest. Local files
+        without a notebook are removed, failing if any was changed since it was exported and not committed.
+
+        :return: tuple of (workspace listing entries to export, local files to remove)
+        """
+        local_files = self.get_mirrored_local_files(args, effective_path, match_pattern, manifest)
+        local = sorted([ (os.path.normpath(x), x) for x in local_files ])
+
+        notebooks = sorted([ (os.path.normpath(self.mk_local_file_from_notebook(x[2], x[3], args.format.upper())), x)
+                             for x in wksp_contents if x[0] == "NOTEBOOK" ], key=itemgetter(0))
+        creates, updates, deletes = self.plan_mirror(notebooks, local)
+        print("mirror: {} notebooks to create, {} to update if changed, {} local files to remove".format(
+            len(creates), len(updates), len(deletes)))
+
+        # files about to be removed must not hold local changes
+        index = self.get_git_status_index()
+        modified_files = [ x for x in deletes if index.is_dirty(x)
+                           and not self.is_unchanged_local_file(x, local_files[x], args.format) ]
+        if len(modified_files) > 0:
+            self.logger.error("Mirror would remove files with uncommitted changes:\n  %s", str(modified_files))
+            raise RuntimeError("There are uncommitted changes : {}".format(str(modified_files)))
+        self.check_mirror_deletes(args, deletes)
+        return creates + [ x[0] for x in updates ], deletes
+
+    def add_commit_commands(self, args, remote):
+        """ add commands to commit exported files and optionally push them """
         # add command for commit
         if not args.no_commit:
             cmd = ['git', 'commit', '-m', """'commited changes exported from workspace'"""]
@@ -395,11 +2447,181 @@ class DatabricksSync:
             cmd = ['git', 'push', remote[0], remote[1]]
             self.add_command(cmd)
 
-        self.execute_cmds_ex(args)
+    # file extensions used for notebooks in source and DBC archives, by language
+    source_extensions = { ".py": "PYTHON", ".scala": "SCALA", ".sql": "SQL", ".r": "R" }
+    dbc_extensions = { ".python": "PYTHON", ".scala": "SCALA", ".sql": "SQL", ".r": "R" }
 
-        return
+    def bulk_export_from_workspace(self, args, effective_path, match_pattern, remote):
+        """ Export a workspace folder as a single archive and unpack it locally
 
+        The folder subtree is fetched with a single export request, then unpacked into individual files
+        named as for a regular export. Only the SOURCE and DBC formats support folder exports.
+        """
+        format = args.format.upper()
+        if format not in ("SOURCE", "DBC"):
+            raise ValueError("`--bulk` export only supports the SOURCE and DBC formats")
+        if args.incremental:
+            raise ValueError("Cannot have option --incremental with option --bulk")
 
+        tmp_dir = tempfile.mkdtemp(prefix="databricks_sync_")
+        try:
+            archive_file = os.path.join(tmp_dir, "export.zip")
+            file_list = os.path.join(tmp_dir, "files.lst")
+
+            cmd = ['databricks', 'workspace', 'export', '--profile', self.profile_to_use,
+                   '--format', format, effective_path, archive_file]
+            self.add_command(cmd)
+
+            cmd = [self.program, 'unpack', '--format', format, '--file-list', file_list]
+            if len(match_pattern) > 0:
+                cmd.extend(['--pattern', match_pattern])
+            if args.recursive:
+                cmd.append('--recursive')
+            if args.overwrite:
+                cmd.append('--overwrite')
+            cmd.extend([archive_file, "."])
+            self.add_command(cmd)
+
+            # stage the unpacked files, as listed by the unpack step
+            cmd = ['git', '--literal-pathspecs', 'add', '--pathspec-from-file={}'.format(file_list),
+                   '--pathspec-file-nul']
+            self.add_command(cmd)
+
+            self.add_commit_commands(args, remote)
+            self.execute_cmds_ex(args)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def unpack_archive(self, archive_file, tgt_root, format, pattern=None, recursive=False, overwrite=False,
+                       file_list=None, chunk_size=1024 * 1024):
+        """ Unpack a folder export archive into individual local files
+
+        Entries are copied from the archive a chunk at a time. Notebooks in SOURCE archives are written
+        as source files; notebooks in DBC archives are each written as a single notebook DBC archive.
+
+        :return: list of files written
+        """
+        files_written = []
+        matcher = self.compile_segment_pattern(pattern, recursive=recursive) if pattern is not None else None
+        with zipfile.ZipFile(archive_file) as archive:
+            entries = [ x for x in archive.infolist() if not x.is_dir() ]
+
+            # archives may place all entries under a folder named after the exported folder
+            top_levels = set([ x.filename.split("/")[0] for x in entries ])
+            strip_prefix = ""
+            if len(top_levels) == 1 and all([ "/" in x.filename for x in entries ]):
+                strip_prefix = top_levels.pop() + "/"
+
+            for entry in entries:
+                name, ext = os.path.splitext(entry.filename[len(strip_prefix):])
+                extensions = self.source_extensions if format == "SOURCE" else self.dbc_extensions
+                language = extensions.get(ext.lower())
+                if language is None:
+                    self.logger.info("ignoring non notebook archive entry [%s]", entry.filename)
+                    continue
+                if matcher is None and not recursive and "/" in name:
+                    continue
+                if matcher is not None and not matcher.is_match(matcher.match_state(name)):
+                    continue
+
+                tgt_file = os.path.join(tgt_root, self.mk_local_file_from_notebook(name, language, format))
+                tgt_file = os.path.normpath(tgt_file)
+                if os.path.exists(tgt_file) and not overwrite:
+                    self.logger.error("File exists [%s] - specify `--overwrite` to overwrite it", tgt_file)
+                    raise RuntimeError("Export would replace existing file and `--overwrite` was not specified")
+                print(" +++ {}".format(tgt_file))
+
+                tgt_dir = os.path.dirname(tgt_file)
+                if len(tgt_dir) > 0:
+                    os.makedirs(tgt_dir, exist_ok=True)
+                with archive.open(entry) as src:
+                    if format == "SOURCE":
+                        with open(tgt_file, "wb") as tgt:
+                            shutil.copyfileobj(src, tgt, chunk_size)
+                    else:
+                        with zipfile.ZipFile(tgt_file, "w", zipfile.ZIP_DEFLATED) as tgt_archive, \
+                             tgt_archive.open(os.path.basename(entry.filename), "w") as tgt:
+                            shutil.copyfileobj(src, tgt, chunk_size)
+                files_written.append(tgt_file)
+
+        if file_list is not None:
+            with open(file_list, "w") as f:
+                f.write("".join([ x + "\0" for x in files_written ]))
+        return files_written
+
+    def get_sync_state_dir(self):
+        """ Get directory in which per repository sync state is kept
+
+        This is kept inside the git directory so that it is never committed
+        """
+        git_stat, git_out = self.execute_cmd_ex(["git", "rev-parse", "--git-dir"])
+        if git_stat.returncode != 0:
+            raise RuntimeError("Could not locate git directory: {}".format(git_stat.stderr))
+        state_dir = os.path.join(os.path.abspath(git_out[0].strip()), "databricks_sync")
+        os.makedirs(state_dir, exist_ok=True)
+        return state_dir
+
+    def load_sync_state(self, name):
+        """ Load named json sync state for the current repository """
+        state_file = os.path.join(self.get_sync_state_dir(), name)
+        try:
+            with open(state_file) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def save_sync_state(self, name, state):
+        """ Save named json sync state for current repository, replacing the previous state atomically """
+        state_file = os.path.join(self.get_sync_state_dir(), name)
+        with open(state_file + ".tmp", "w") as f:
+            json.dump(state, f, indent=1, sort_keys=True)
+        os.replace(state_file + ".tmp", state_file)
+        self.logger.debug("saved sync state : %s", state_file)
+
+    def file_hash(self, path, chunk_size=1024 * 1024):
+        """ Get sha256 hash of file contents, reading file in chunks """
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def load_manifest(self):
+        """ Get the export manifest entries for the current profile, by workspace path """
+        return self.load_sync_state("manifest.json").get(self.profile_to_use, {})
+
+    def update_manifest(self, exports, format):
+        """ Record exported notebooks in the export manifest
+
+        :param exports: list of tuples of (workspace path, local file, workspace object info)
+        """
+        state = self.load_sync_state("manifest.json")
+        manifest = state.setdefault(self.profile_to_use, {})
+        for wksp_file, tgt_file, info in exports:
+            if not os.path.exists(tgt_file):
+                continue
+            info = info or {}
+            manifest[wksp_file] = { "local_file": os.path.abspath(tgt_file),
+                                    "format": format.upper(),
+                                    "object_id": info.get("object_id"),
+                                    "modified_at": info.get("modified_at"),
+                                    "sha256": self.file_hash(tgt_file) }
+        self.save_sync_state("manifest.json", state)
+
+    def is_unchanged_local_file(self, tgt_file, previous, format):
+        """ check if local file is the unmodified result of the previous export """
+        return (previous.get("local_file") == os.path.abspath(tgt_file)
+                and previous.get("format") == format.upper()
+                and os.path.exists(tgt_file)
+                and previous.get("sha256") == self.file_hash(tgt_file))
+
+    def is_unchanged_notebook(self, info, previous):
+        """ check if workspace notebook is unchanged since previous export """
+        if info is None or info.get("modified_at") is None:
+            # without modification times (cli transport), notebooks always need to be exported
+            return False
+        return (info.get("object_id") == previous.get("object_id")
+                and info.get("modified_at") == previous.get("modified_at"))
 
     magic_check=re.compile("([?*[])")
 
@@ -408,19 +2630,213 @@ class DatabricksSync:
         match=self.magic_check.search(s)
         return match is not None
 
+    def _translate_path_segment(self, segment):
+        """ translate a single glob path segment to a regular expression """
+        i, n = 0, len(segment)
+        result = ""
+        while i < n:
+            c = segment[i]
+            i = i + 1
+            if c == "*":
+                result = result + "[^/]*"
+            elif c == "?":
+                result = result + "[^/]"
+            elif c == "[":
+                j = i + 1 if i < n and segment[i] in "!]" else i
+                j = segment.find("]", j)
+                if j < 0:
+                    result = result + "\\["
+                else:
+                    chars = segment[i:j].replace("\\", "\\\\").replace("[", "\\[")
+                    if chars.startswith("!"):
+                        chars = "^" + chars[1:]
+                    elif chars.startswith("^"):
+                        chars = "\\" + chars
+                    result = result + "[" + chars + "]"
+                    i = j + 1
+            else:
+                result = result + re.escape(c)
+        return result
+
+    def compile_path_pattern(self, pattern):
+        """ Compile a glob style path pattern to a regular expression matching normalized paths
+
+        `**` matches zero or more directories, other wildcards do not match across `/`. Patterns ending with `/`
+        only match paths ending with `/`.
+        """
+        parts = os.path.normpath(pattern).split("/")
+        regex = ""
+        for i, part in enumerate(parts):
+            last = i == len(parts) - 1
+            if part == "**":
+                regex = regex + (".*" if last else "(?:.*/)?")
+            else:
+                regex = regex + self._translate_path_segment(part) + ("" if last else "/")
+        if pattern.endswith("/"):
+            regex = regex + "/"
+        return re.compile("^" + regex + "$")
+
+    def compile_segment_pattern(self, pattern, recursive=False):
+        """ Compile a glob style relative path pattern to a `PathPattern`
+
+        Recursive patterns with no `**` match their last segment at any depth, as if it were preceded by `**`.
+        Patterns ending with `/` only match folders.
+        """
+        segments = [ x for x in pattern.split("/") if x not in ("", ".") ]
+        if recursive and "**" not in segments:
+            segments = segments[:-1] + [ "**" ] + segments[-1:]
+        return PathPattern([ None if x == "**" else re.compile(self._translate_path_segment(x) + "$")
+                             for x in segments ], directories_only=pattern.endswith("/"))
+
+    def split_workspace_pattern(self, path, recursive=False):
+        """ Split a workspace path into the folder before any wildcards and a pattern for the paths below it
+
+        :return: tuple of (folder, relative pattern, `PathPattern`), with None for the patterns if the path has
+                 no wildcards
+        """
+        segments = path.split("/")
+        for i, segment in enumerate(segments):
+            if self.has_magic(segment):
+                break
+        else:
+            return path, None, None
+        pattern = "/".join(segments[i:])
+        return "/".join(segments[:i]) or "/", pattern, self.compile_segment_pattern(pattern, recursive=recursive)
+
+    # files holding `.gitignore` style patterns of local paths to skip, read from each directory scanned
+    ignore_files = [".gitignore", ".databricks_sync_ignore"]
+
+    def read_ignore_rules(self, folder):
+        """ Read the ignore patterns of a directory
+
+        Patterns use `.gitignore` syntax: `!` re-includes a path, a trailing `/` only matches directories and
+        patterns containing a `/` are relative to the directory, while others match at any depth below it.
+
+        :return: list of tuples of (compiled pattern, negated, directories only) matching paths relative to `folder`
+        """
+        rules = []
+        for name in self.ignore_files:
+            try:
+                with open(os.path.join(folder, name), errors="replace") as f:
+                    lines = f.read().splitlines()
+            except OSError:
+                continue
+            for line in lines:
+                line = line.rstrip()
+                if len(line) == 0 or line.startswith("#"):
+                    continue
+                negated = line.startswith("!")
+                if negated:
+                    line = line[1:]
+                if line.startswith("\\"):
+                    line = line[1:]
+                dir_only = line.endswith("/")
+                anchored = "/" in line.rstrip("/")
+                line = line.strip("/")
+                if len(line) == 0:
+                    continue
+                rules.append((self.compile_path_pattern(line if anchored else "**/" + line), negated, dir_only))
+        return rules
+
+    def is_ignored(self, rules, path, is_dir):
+        """ check if normalized path is ignored by the rules in effect, where the last matching rule wins """
+        ignored = False
+        for base_len, prefix, pattern, negated, dir_only in rules:
+            if (is_dir or not dir_only) and pattern.match(prefix + path[base_len:]):
+                ignored = not negated
+        return ignored
+
+    def get_ancestor_ignore_rules(self, root, norm_root):
+        """ Get the ignore rules of the directories above `root`, up to the top of the enclosing git repository """
+        rules = []
+        base_len = len(norm_root) + 1 if len(norm_root) > 0 else 0
+        real_root = os.path.realpath(root)
+        folder = real_root
+        while not os.path.exists(os.path.join(folder, ".git")):
+            parent = os.path.dirname(folder)
+            if parent == folder:
+                # not in a git repository
+                return []
+            folder = parent
+            prefix = os.path.relpath(real_root, folder) + "/"
+            rules = [ (base_len, prefix) + x for x in self.read_ignore_rules(folder) ] + rules
+        return rules
+
     def get_dir_listing_ex(self, filepath, recursive=False):
-        """ Get listing of local file system"""
-        # files = os.scandir(filepath)
-        # return [ x.path for x in files]
+        """ Get listing of local files matching a path pattern, with their size and modification time
+
+        The file system is walked with `os.scandir` from the part of the pattern without wildcards, and the
+        pattern is compiled once. Only directories that could hold paths matching the pattern are entered.
+        As with `glob`, hidden files and directories are skipped and paths keep the form of the pattern.
+        Paths ignored by the `ignore_files` found while walking, or in the directories above up to the top of the
+        git repository, are skipped and ignored directories are not entered.
+
+        :return: list of tuples of (path, size, modification time in ns)
+        """
         self.logger.debug("getting file listing for [%s] with recursive: %s", filepath, recursive)
-        return glob.glob(filepath, recursive=recursive)
+        if filepath.endswith("/"):
+            # as with `glob`, a pattern ending with `/` only matches directories
+            self.logger.debug("pattern [%s] only matches directories - no files listed", filepath)
+            return []
+        if not recursive:
+            filepath = filepath.replace("**", "*")
+        root = self.get_local_root(filepath)
+        norm_root = os.path.normpath(root)
+        parts = os.path.normpath(filepath).split("/")
+        root_parts = [] if norm_root == "." else norm_root.split("/")
+        pattern = self.compile_segment_pattern("/".join(parts[len(root_parts):]))
+        # `glob` only prefixes paths with `./` if the pattern has it
+        strip_prefix = 2 if norm_root == "." and not filepath.startswith("./") else 0
+
+        if norm_root == ".":
+            norm_root = ""
+        files = []
+        # each directory to scan has its normalized path, pattern match state and the ignore rules in effect. Rules
+        # match the path relative to the directory they were read from, as prefix + path[base_len:]
+        folders = [ (root, norm_root, pattern.start, self.get_ancestor_ignore_rules(root, norm_root)) ]
+        while len(folders) > 0:
+            folder, norm_folder, state, rules = folders.pop()
+            try:
+                entries = list(os.scandir(folder))
+            except OSError:
+                # folder removed while scanning
+                continue
+            if any([ x.name in self.ignore_files for x in entries ]):
+                base_len = len(norm_folder) + 1 if len(norm_folder) > 0 else 0
+                rules = rules + [ (base_len, "") + x for x in self.read_ignore_rules(folder) ]
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                norm_path = entry.name if len(norm_folder) == 0 else norm_folder + "/" + entry.name
+                entry_state = pattern.step(state, entry.name)
+                try:
+                    if entry.is_dir():
+                        if not pattern.can_descend(entry_state):
+                            continue
+                        if len(rules) > 0 and self.is_ignored(rules, norm_path, True):
+                            continue
+                        if entry.is_symlink():
+                            # don't follow links back to directories being scanned
+                            target = os.path.realpath(entry.path)
+                            if (os.path.realpath(folder) + "/").startswith(target + "/"):
+                                continue
+                        folders.append((entry.path, norm_path, entry_state, rules))
+                    elif pattern.is_match(entry_state):
+                        if len(rules) > 0 and self.is_ignored(rules, norm_path, False):
+                            continue
+                        stat = entry.stat()
+                        files.append((entry.path[strip_prefix:], stat.st_size, stat.st_mtime_ns))
+                except OSError:
+                    continue
+        return files
 
     def get_dir_listing(self, filepath, recursive=False):
-        """ Get listing of local file system"""
-        #files = os.scandir(filepath)
-        #return [ x.path for x in files]
-        self.logger.debug("getting file listing for [%s] with recursive: %s", filepath, recursive)
-        return glob.glob(filepath, recursive=recursive)
+        """ Get listing of local files matching a path pattern """
+        return [ x[0] for x in self.get_dir_listing_ex(filepath, recursive=recursive) ]
+
+    def scan_local_files(self, filepath, recursive=False):
+        """ Get the local files matching a path pattern as a dictionary of path to (modification time, size) """
+        return { path: (mtime, size) for path, size, mtime in self.get_dir_listing_ex(filepath, recursive=recursive) }
 
     def _wksp_folder_listing(self, filePath, extended, absolute_paths):
         """Get workspace folder listing for single folder"""
@@ -432,82 +2848,176 @@ class DatabricksSync:
             cmd.append("--absolute")
 
         cmd.append(filePath)
-        git_status, git_status_out = self.execute_cmd_ex(cmd)
-        return git_status, git_status_out
 
-    def match_filter(self, filename, filter):
-        """ Match file name or notebook name against filter """
-        if filter is None:
-            return True
+        # full listings can be answered from the catalog while fresh
+        use_catalog = self.catalog is not None and extended and absolute_paths
+        cached = self._cached_folder_listing(cmd, filePath) if use_catalog else None
+        if cached is not None:
+            return cached
 
-        dirn, basen = os.path.split(filename)
-        return fnmatch.fnmatch(basen, filter)
+        git_status, git_status_out = self.execute_cmd_ex(cmd)
+        if use_catalog and git_status.returncode == 0:
+            self.catalog.put(self.profile_to_use, filePath, git_status_out,
+                             getattr(git_status, "listing_info", None))
+        return git_status, git_status_out
 
+    async def _wksp_folder_listing_async(self, filePath):
+        """ Get full workspace folder listing for single folder, as a coroutine on the asyncio engine """
+        cmd = ['databricks', 'workspace', 'ls', '--profile', self.profile_to_use, "-l", "--absolute", filePath]
+        use_catalog = self.catalog is not None
+        cached = self._cached_folder_listing(cmd, filePath) if use_catalog else None
+        if cached is not None:
+            return cached
+
+        wksp_ls, wksp_ls_out = await self.execute_cmd_async(cmd)
+        if use_catalog and wksp_ls.returncode == 0:
+            self.catalog.put(self.profile_to_use, filePath, wksp_ls_out, getattr(wksp_ls, "listing_info", None))
+        return wksp_ls, wksp_ls_out
+
+    def _cached_folder_listing(self, cmd, filePath):
+        """ Get folder listing from the catalog as the result of `cmd`, or None if not cached or stale """
+        if self.refresh_cache:
+            return None
+        cached = self.catalog.get(self.profile_to_use, filePath, self.cache_ttl)
+        if cached is None:
+            return None
+        self.logger.debug("using cached listing for [%s]", filePath)
+        lines, info = cached
+        result = subprocess.CompletedProcess(cmd, 0, stdout="\n".join(lines), stderr="")
+        if self.client is not None and info is not None:
+            result.listing_info = info
+        return result, lines
 
     def get_workspace_listing(self, filepath, extended=False, absolute_paths=False, recursive=False,
                               allow_other=False, omit_dirs=False,
                               showProgress=False):
-        """ Get listing of workspace at path"""
+        """ Get listing of workspace at path
+
+        Returns sorted list of tuples of (type, listing line, path, language, object info)
+        """
+        files = self.iter_workspace_listing(filepath, extended=extended, absolute_paths=absolute_paths,
+                                            recursive=recursive, allow_other=allow_other, omit_dirs=omit_dirs,
+                                            showProgress=showProgress)
+        return sorted(files, key=itemgetter(2))
+
+    def iter_workspace_listing(self, filepath, extended=False, absolute_paths=False, recursive=False,
+                               allow_other=False, omit_dirs=False,
+                               showProgress=False):
+        """ Generate listing of workspace at path
+
+        Yields the same tuples as `get_workspace_listing`, unsorted, as each folder listing is read.
+        Folder listings are only requested while the consumer is pulling entries, with up to `--jobs`
+        listings in flight.
+
+        Paths with wildcards are listed from the folder before the first wildcard, and only folders that could
+        hold paths matching the pattern are listed. Folders are returned if they match or could hold matches.
+        """
         effective_path = self.mk_workspace_path(filepath)
         self.logger.debug("effective path : %s", effective_path)
 
-        pattern_filter=None
-
-        if self.has_magic(effective_path):
-            effective_path, pattern_filter = os.path.split(effective_path)
+        effective_path, _, pattern = self.split_workspace_pattern(effective_path, recursive=recursive)
 
         re_notebook=re.compile("^NOTEBOOK +(.*) +([A-Z]+)$")
         re_folder=re.compile("^DIRECTORY +(.*)$")
         re_other = re.compile("^([A-Z]+) +(.*)$")
 
+        root = effective_path if effective_path.endswith("/") else effective_path+"/"
 
+        listing = WorkspaceListing(root, absolute_paths=absolute_paths)
 
-        folders_to_process = [ effective_path ]
-        files = []
+        # folders to list, with the state of the pattern match reached at each and their node in the listing
+        folders_to_process = deque([ (effective_path, pattern.start if pattern is not None else None, 0) ])
         if showProgress:
             sys.stdout.write("Getting workspace listing ...")
             sys.stdout.flush()
 
-        # process folders
-        while len(folders_to_process) > 0:
-            if showProgress:
-                sys.stdout.write(".")
-                sys.stdout.flush()
-            path_to_process = folders_to_process[0]
-            folders_to_process = folders_to_process[1:]
-            wksp_ls, wksp_ls_out = self._wksp_folder_listing(path_to_process,
-                                                        extended=True,
-                                                        absolute_paths=True)
-
+        def process_listing(wksp_ls, wksp_ls_out, state, node):
+            """ parse the listing of a single folder, queueing sub folders to descend into """
+            files = []
             if wksp_ls.returncode != 0:
                 self.logger.error("Workspace listing error: %s", wksp_ls.stdout)
+            # object id and modification time of the listed objects, only known with the REST transport
+            listing_info = getattr(wksp_ls, "listing_info", None) or {}
+            # the REST transport formats listing lines as entries do, so they need not be kept
+            keep_rows = self.client is None
+
+            def match(path):
+                """ get the match state of a listed path, or None if there is no pattern """
+                if pattern is None:
+                    return None
+                # listing a notebook rather than a folder lists the notebook itself, which can't match
+                if not path.startswith(root):
+                    return frozenset()
+                return pattern.step(state, path.rsplit("/", 1)[-1])
 
             for fp in wksp_ls_out:
                 m_nb = re_notebook.match(fp)
                 if m_nb is not None:
-                    if self.match_filter(fp, pattern_filter):
-                        files.append( ("NOTEBOOK",fp, m_nb.group(1).strip(), m_nb.group(2)))
+                    nb_path = m_nb.group(1).strip()
+                    if pattern is None or pattern.is_match(match(nb_path)):
+                        files.append(ListingEntry(listing, "NOTEBOOK", listing.add(node, nb_path),
+                                                  sys.intern(m_nb.group(2)), listing_info.get(nb_path),
+                                                  row=fp if keep_rows else None))
                 else:
                     m_dir = re_folder.match(fp)
                     if m_dir is not None:
-                        if not omit_dirs:
-                            files.append(("FOLDER", fp, m_dir.group(1).strip()+"/", ""))
-                        if recursive:
-                            folders_to_process.append(m_dir.group(1).strip())
+                        dir_path = m_dir.group(1).strip()
+                        dir_state = match(dir_path)
+                        if pattern is None:
+                            descend = recursive
+                            listed = True
+                        else:
+                            descend = pattern.can_descend(dir_state)
+                            listed = descend or pattern.is_match(dir_state, is_dir=True)
+                        if listed or descend:
+                            dir_node = listing.add(node, dir_path)
+                        if listed and not omit_dirs:
+                            files.append(ListingEntry(listing, "FOLDER", dir_node,
+                                                      row=fp if keep_rows else None))
+                        if descend:
+                            folders_to_process.append((dir_path, dir_state, dir_node))
                     elif allow_other and fp is not None and len(fp) > 0:
                         m_other = re_other.match(fp)
-                        if self.match_filter(fp, pattern_filter):
-                            files.append(("OTHER", fp, m_other.group(2).strip()+ " (L)" if m_other is not None else fp, ""))
+                        other_path = m_other.group(2).strip() if m_other is not None else fp
+                        if pattern is None or pattern.is_match(match(other_path)):
+                            other = (fp, other_path + " (L)" if m_other is not None else fp)
+                            if not absolute_paths:
+                                other = (other[0].replace(root, ""), other[1].replace(root, ""))
+                            files.append(ListingEntry(listing, "OTHER", -1, other=other))
+            return files
+
+        # process folders breadth first, keeping up to `jobs` folder listings in flight, on threads or as
+        # coroutines of the asyncio engine, with the match state of the folder each listing is for
+        jobs = max(1, self.jobs)
+        executor = ThreadPoolExecutor(max_workers=jobs) if self.engine is None else contextlib.nullcontext()
+        with self.phase("listing"), executor:
+            in_flight = {}
+            while len(folders_to_process) > 0 or len(in_flight) > 0:
+                while len(folders_to_process) > 0 and len(in_flight) < jobs:
+                    path_to_process, state, node = folders_to_process.popleft()
+                    if self.engine is not None:
+                        future = self.engine.submit(self._wksp_folder_listing_async(path_to_process))
+                    else:
+                        future = executor.submit(self._wksp_folder_listing, path_to_process,
+                                                 extended=True, absolute_paths=True)
+                    in_flight[future] = (state, node)
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    state, node = in_flight.pop(future)
+                    if showProgress:
+                        sys.stdout.write(".")
+                        sys.stdout.flush()
+                    wksp_ls, wksp_ls_out = future.result()
+                    for x in process_listing(wksp_ls, wksp_ls_out, state, node):
+                        yield x
 
         if showProgress:
             print(" ")
 
-        # clean up output
-        root = effective_path if effective_path.endswith("/") else effective_path+"/"
-        if not absolute_paths:
-            files = [ (x[0], x[1].replace(root, ""), x[2].replace(root, ""), x[3]) for x in files]
-
-        return sorted(files, key=itemgetter(2))
+        if self.catalog is not None:
+            evicted = self.catalog.evict()
+            self.logger.debug("evicted %d folders from catalog", evicted)
 
     def adjust_local_paths(self, fpath,args):
         local_dir, local_patt = os.path.split(fpath)
@@ -546,20 +3056,138 @@ class DatabricksSync:
 
         showProgress = not args.verbose and not args.debug
         wksp_contents = self.get_workspace_listing(args.wksp_path, extended=args.long,
-                                                   absolute_paths=args.absolute,
+                                                   absolute_paths=args.absolute and not args.content,
                                                    recursive=args.recursive,
                                                    showProgress=showProgress,
                                                    omit_dirs=True)
 
+        if args.content:
+            differences = self.diff_contents(args, local_path, dir_contents, wksp_contents)
+            if args.exit_code and differences:
+                sys.exit(1)
+            return
+
         display_contents=[ x[2] for x in wksp_contents]
         print("local file system contents:", dir_contents)
         print("workspace contents:", display_contents)
 
+    def get_local_root(self, local_path):
+        """ Get the directory part of a local path pattern preceding any wildcards """
+        parts = []
+        for part in os.path.dirname(local_path).split("/"):
+            if self.has_magic(part):
+                break
+            parts.append(part)
+        return "/".join(parts) or "."
+
+    def bounded_map(self, func, items, max_in_flight=None):
+        """ Apply func to items on up to `--jobs` threads, yielding (item, result) pairs as they complete
+
+        At most `max_in_flight` items are submitted at a time, so that results are not accumulated
+        for large numbers of items. Coroutine functions are run on the asyncio engine instead of threads.
+        """
+        jobs = max(1, self.jobs)
+        max_in_flight = max_in_flight or jobs * 2
+        items = iter(items)
+        on_engine = self.engine is not None and asyncio.iscoroutinefunction(func)
+        with contextlib.nullcontext() if on_engine else ThreadPoolExecutor(max_workers=jobs) as executor:
+            in_flight = {}
+            while True:
+                for item in items:
+                    future = self.engine.submit(func(item)) if on_engine else executor.submit(func, item)
+                    in_flight[future] = item
+                    if len(in_flight) >= max_in_flight:
+                        break
+                if len(in_flight) == 0:
+                    return
+                done, pending = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield in_flight.pop(future), future.result()
+
+    def diff_contents(self, args, local_path, dir_contents, wksp_contents):
+        """ Compare contents of local files and workspace notebooks
+
+        Local files are paired with workspace notebooks using the file names that export would produce.
+        Notebooks are exported in source format concurrently to a temporary directory and compared by hash,
+        so only hashes (and, with `--unified`, the temporary files of changed notebooks) are kept.
+
+        :return: True if there are any differences
+        """
+        local_root = self.get_local_root(local_path)
+        local_files = { os.path.normpath(os.path.relpath(x, local_root)): x for x in dir_contents }
+
+        wksp_root, _, _ = self.split_workspace_pattern(self.mk_workspace_path(args.wksp_path))
+        wksp_files = {}
+        for x in wksp_contents:
+            if x[0] == "NOTEBOOK":
+                wksp_files[self.mk_local_file_from_notebook(x[2], x[3], "SOURCE")] = \
+                    self.mk_workspace_path(wksp_root, x[2])
+
+        added = sorted(set(local_files.keys()) - set(wksp_files.keys()))
+        removed = sorted(set(wksp_files.keys()) - set(local_files.keys()))
+        common = sorted(set(local_files.keys()) & set(wksp_files.keys()))
+        changed = []
+        identical = []
+
+        tmp_dir = tempfile.mkdtemp(prefix="databricks_sync_")
+        try:
+            def compare(item):
+                """ export notebook to temporary file and compare its hash with the local file """
+                index, name = item
+                tmp_file = os.path.join(tmp_dir, "{}.src".format(index))
+                cmd = ['databricks', 'workspace', 'export', '--profile', self.profile_to_use,
+                       '--format', 'SOURCE', wksp_files[name], tmp_file]
+                cmd_stat, cmd_out = self.execute_cmd_ex(cmd)
+                if cmd_stat.returncode != 0:
+                    raise RuntimeError("Could not export [{}]: {}".format(wksp_files[name], cmd_stat.stderr))
+                same = self.file_hash(tmp_file) == self.file_hash(local_files[name])
+                if same or not args.unified:
+                    os.remove(tmp_file)
+                return same, tmp_file
+
+            changed_files = {}
+            for item, result in self.bounded_map(compare, enumerate(common)):
+                name = item[1]
+                same, tmp_file = result
+                if same:
+                    identical.append(name)
+                else:
+                    changed.append(name)
+                    changed_files[name] = tmp_file
+
+            for name in added:
+                print("A  {}".format(name))
+            for name in removed:
+                print("D  {}".format(name))
+            for name in sorted(changed):
+                print("M  {}".format(name))
+            if args.long:
+                for name in sorted(identical):
+                    print("=  {}".format(name))
+
+            if args.unified:
+                for name in sorted(changed):
+                    with open(changed_files[name], errors="replace") as wksp_f, \
+                         open(local_files[name], errors="replace") as local_f:
+                        sys.stdout.writelines(difflib.unified_diff(wksp_f.readlines(), local_f.readlines(),
+                                                                   fromfile=wksp_files[name],
+                                                                   tofile=local_files[name]))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        print("{} added, {} removed, {} changed, {} identical".format(len(added), len(removed),
+                                                                       len(changed), len(identical)))
+        return len(added) + len(removed) + len(changed) > 0
+
     def import_to_workspace(self, args):
         """Export command implementation"""
         self.logger.debug("starting import")
         self.get_params(args)
 
+        if args.resume:
+            self.resume_run(args, "import")
+            return
+
         #  get list of files matching pattern
 
         if "**" in args.src_path or "**" in args.wksp_path:
@@ -584,11 +3212,43 @@ class DatabricksSync:
         local_path = self.adjust_local_paths(args.src_path, args)
 
         dir_contents = self.get_dir_listing(local_path, recursive=args.recursive)
-        print(dir_contents)
 
         effective_path = self.mk_workspace_path(args.wksp_path)
 
-        import_files = list(map( lambda x: (x, self.mk_workspace_path(effective_path, x)), dir_contents))
+        if args.mirror:
+            if args.bulk:
+                raise ValueError("Cannot have option --mirror with option --bulk")
+            self.mirror_to_workspace(args, local_path, effective_path, dir_contents)
+            return
+
+        # when incremental, only import files changed since the last import to the same workspace path
+        deleted_files = []
+        updated_files = set()
+        last_import = None
+        if args.incremental:
+            last_import = self.load_sync_state("import_state.json").get(self.profile_to_use, {}) \
+                              .get(effective_path, {}).get(local_path)
+            changes = self.get_changes_since_commit(last_import, include_working_tree=args.force) \
+                          if last_import is not None else None
+            if changes is None:
+                self.logger.warning("No previous import found for [%s] - importing all files", effective_path)
+            else:
+                changed_files, deleted, updated_files = changes
+                if args.force:
+                    changed_files.update([ x[1] for x in modified_files if x[0] == "??"])
+                print("{} files changed since commit {}".format(len(changed_files), last_import[:10]))
+                dir_contents = [ x for x in dir_contents if self.is_changed_file(x, changed_files)]
+                pattern = self.compile_path_pattern(local_path)
+                deleted_files = sorted([ x for x in deleted if pattern.match(x) ])
+
+        print(dir_contents)
+
+        import_files = [ (x, self.mk_import_target(effective_path, x, args.keep_extensions)) for x in dir_contents ]
+        self.logger.debug("files to import to workspace (src, target): %s", import_files)
+
+        if args.bulk:
+            self.bulk_import_to_workspace(args, effective_path, import_files)
+            return
 
         #  determine folders needed on target
         folders=set([ os.path.dirname(x2[1]) for x2 in import_files])
@@ -601,40 +3261,347 @@ class DatabricksSync:
 
         #  for each of the  files generate command to import them to the workspace
         # i.e databricks workspace import --language SCALA --format DBC src_file tgt_destination
+        # notebooks of files modified since the last import were imported then, so they are replaced
+        for x in import_files:
+            overwrite = args.overwrite or os.path.normpath(x[0]) in updated_files
+            self.add_command(self.mk_import_command(args, x[0], x[1], overwrite))
+
+        # remove notebooks for files deleted locally, unless the notebook is being replaced
+        if args.delete and len(deleted_files) > 0:
+            imported = set([ x[1] for x in import_files])
+            for f in deleted_files:
+                tgt_file = self.mk_import_target(effective_path, f, args.keep_extensions)
+                if tgt_file not in imported:
+                    print(" --- {}".format(tgt_file))
+                    self.add_command(['databricks', 'workspace', 'rm', '--profile', self.profile_to_use, tgt_file],
+                                     phase="prepare")
+        elif len(deleted_files) > 0:
+            self.logger.warning("Files deleted since last import were not removed (use `--delete`): %s", deleted_files)
+
+        self.execute_cmds_ex(args, finish={ "import": [ effective_path, local_path ] } if args.incremental else None,
+                             journal_name="import")
+
+    def mirror_to_workspace(self, args, local_path, effective_path, dir_contents):
+        """ Import local files so that the workspace folder mirrors them
+
+        Local files are merged with the notebooks their path pattern would be imported to, by workspace path.
+        Files without a notebook are imported and notebooks without a file are removed. Files with a notebook are
+        imported if changed in git since the last import recorded for the paths, or all of them if there is none.
+        """
+        # notebooks the local path pattern maps to, in the language of its extension if it has one
+        wksp_pattern = self.mk_import_target(effective_path, local_path, args.keep_extensions)
+        language = None
+        if not args.keep_extensions and args.format.upper() == "SOURCE":
+            language = self.source_extensions.get(os.path.splitext(local_path)[1].lower())
+        wksp_contents = self.get_workspace_listing(wksp_pattern, absolute_paths=True, recursive=args.recursive,
+                                                   omit_dirs=True)
+        notebooks = [ (x[2], x) for x in wksp_contents
+                      if x[0] == "NOTEBOOK" and (language is None or x[3] == language) ]
+        local = sorted([ (self.mk_import_target(effective_path, x, args.keep_extensions), x) for x in dir_contents ])
+        creates, updates, deletes = self.plan_mirror(local, notebooks)
+
+        last_import = self.load_sync_state("import_state.json").get(self.profile_to_use, {}) \
+                          .get(effective_path, {}).get(local_path)
+        changes = self.get_changes_since_commit(last_import, include_working_tree=args.force) \
+                      if last_import is not None else None
+        if changes is not None:
+            updates = [ x for x in updates if self.is_changed_file(x[0], changes[0]) ]
+        print("mirror: {} files to create, {} to update, {} notebooks to remove".format(
+            len(creates), len(updates), len(deletes)))
+        deleted = [ x[2] for x in deletes ]
+        self.check_mirror_deletes(args, deleted)
+
+        import_files = [ (x, self.mk_import_target(effective_path, x, args.keep_extensions)) for x in creates ]
+        update_files = [ (x[0], x[1][2]) for x in updates ]
+        for f in set([ os.path.dirname(x[1]) for x in import_files + update_files ]):
+            self.add_command(['databricks', 'workspace', 'mkdirs', '--profile', self.profile_to_use, f])
+        for x in import_files:
+            print(" +++ {}".format(x[1]))
+            self.add_command(self.mk_import_command(args, x[0], x[1], args.overwrite))
+        for x in update_files:
+            print(" *** {}".format(x[1]))
+            self.add_command(self.mk_import_command(args, x[0], x[1], True))
+        for f in deleted:
+            self.add_command(['databricks', 'workspace', 'rm', '--profile', self.profile_to_use, f])
+
+        self.execute_cmds_ex(args, finish={ "import": [ effective_path, local_path ] }, journal_name="import")
+
+    def mk_import_target(self, effective_path, src_file, keep_extensions=False):
+        """ Get the workspace path a local file is imported to """
+        tgt_file = self.mk_workspace_path(effective_path, src_file)
+        if not keep_extensions:
+            tgt_file, ext = os.path.splitext(tgt_file)
+        return tgt_file
+
+    def mk_import_command(self, args, src_file, tgt_file, overwrite=False):
+        """ Make command to import a local file as a workspace notebook """
+        cmd = ['databricks', 'workspace', 'import', '--profile', self.profile_to_use,
+               '--format', args.format, '--language', args.language]
+        if overwrite:
+            cmd.append("--overwrite")
+        cmd.append(src_file)
+        cmd.append(tgt_file)
+        return cmd
+
+    def bulk_import_to_workspace(self, args, effective_path, import_files):
+        """ Import local files to the workspace by packing them into a single DBC archive
+
+        The archive is imported as the folder `effective_path`. If the folder exists, it is replaced when
+        `--overwrite` is given: it is only removed once the archive is packed, and objects of the folder that
+        are not in the archive count against `--max-delete`.
+        """
+        if args.format.upper() != "SOURCE":
+            raise ValueError("`--bulk` import only supports files in SOURCE format")
+        if args.incremental:
+            raise ValueError("Cannot have option --incremental with option --bulk")
 
-        if not args.keep_extensions:
-            import_files2 = []
-            for f in import_files:
-                src_file = f[0]
-                tgt_file, ext = os.path.splitext(f[1])
-                import_files2.append( (src_file, tgt_file) )
-            import_files =import_files2
-        self.logger.debug("files to import to workspace (src, target): %s", import_files)
+        tmp_dir = tempfile.mkdtemp(prefix="databricks_sync_")
+        try:
+            archive_file = os.path.join(tmp_dir, "import.dbc")
+            file_list = os.path.join(tmp_dir, "files.lst")
+
+            # list the files to pack, with their paths relative to the target folder
+            with open(file_list, "w") as f:
+                for src_file, tgt_file in import_files:
+                    f.write("{}\0{}\0".format(src_file, os.path.relpath(tgt_file, effective_path)))
+
+            self.add_command([self.program, 'pack', '--language', args.language.upper(),
+                              '--file-list', file_list, archive_file, os.path.basename(effective_path)])
+            target_status, target_listing = self._wksp_folder_listing(effective_path, extended=True,
+                                                                      absolute_paths=True)
+            if target_status.returncode == 0:
+                if not args.overwrite:
+                    raise RuntimeError("Workspace folder [{}] exists and `--overwrite` was not specified".format(
+                                       effective_path))
+                replaced = set(tgt_file for _, tgt_file in import_files)
+                existing = self.get_workspace_listing(effective_path, extended=True, absolute_paths=True,
+                                                      recursive=True, allow_other=True, omit_dirs=True)
+                self.check_mirror_deletes(args, [x[2] for x in existing if x[2] not in replaced])
+                self.add_command(['databricks', 'workspace', 'rm', '--profile', self.profile_to_use,
+                                  '-r', effective_path], phase="replace")
+            self.add_command(['databricks', 'workspace', 'mkdirs', '--profile', self.profile_to_use,
+                              os.path.dirname(effective_path)])
+            self.add_command(['databricks', 'workspace', 'import', '--profile', self.profile_to_use,
+                              '--format', 'DBC', archive_file, effective_path])
+
+            self.execute_cmds_ex(args)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    # comment prefixes for notebook source files, by language
+    comment_prefixes = { "PYTHON": "#", "R": "#", "SCALA": "//", "SQL": "--" }
+
+    def source_to_commands(self, source, language):
+        """ Split notebook source into the command texts of its cells """
+        prefix = self.comment_prefixes[language]
+        header = "{} Databricks notebook source".format(prefix)
+        if source.startswith(header):
+            source = source[len(header):]
+
+        commands = []
+        for cell in source.split("\n{} COMMAND ----------\n".format(prefix)):
+            lines = cell.strip("\n").split("\n")
+            magic = "{} MAGIC".format(prefix)
+            if all([ x.startswith(magic) for x in lines ]):
+                lines = [ x[len(magic) + 1:] for x in lines ]
+            commands.append("\n".join(lines))
+        return commands
+
+    def pack_archive(self, archive_file, root, language, file_list):
+        """ Pack local source files into a DBC archive
+
+        Files are read and converted one at a time and written to the archive as they are converted.
+
+        :param file_list: file listing NUL separated pairs of local file and path within the archive
+        :return: list of archive entries written
+        """
+        with open(file_list) as f:
+            fields = f.read().split("\0")
+
+        extensions = { v: k for k, v in self.dbc_extensions.items() }
+        entries = []
+        with zipfile.ZipFile(archive_file, "w", zipfile.ZIP_DEFLATED) as archive:
+            for index, (src_file, tgt_path) in enumerate(zip(fields[0::2], fields[1::2])):
+                with open(src_file, errors="replace") as src:
+                    commands = self.source_to_commands(src.read(), language)
+                notebook = { "version": "NotebookV1", "origId": index + 1, "name": os.path.basename(tgt_path),
+                             "language": language.lower(),
+                             "commands": [ { "version": "CommandV1", "origId": index * 1000 + position + 1,
+                                             "subtype": "command", "commandType": "auto",
+                                             "position": float(position + 1), "command": command }
+                                           for position, command in enumerate(commands) ] }
+                entry = "{}/{}{}".format(root, tgt_path, extensions[language])
+                with archive.open(entry, "w") as tgt:
+                    tgt.write(json.dumps(notebook).encode("utf-8"))
+                entries.append(entry)
+        return entries
+
+    def get_changes_since_commit(self, commit, include_working_tree=False):
+        """ Get files changed and deleted since commit, relative to current directory
+
+        :param commit: commit to compare against
+        :param include_working_tree: if true compare against working tree rather than HEAD
+        :return: tuple of (set of changed files, set of deleted files, set of modified files) or None if commit is
+                 not known. Modified files are the changed files that existed at the commit
+        """
+        cmd = ["git", "diff", "--name-status", "--no-renames", "-z", "--relative", commit]
+        if not include_working_tree:
+            cmd.append("HEAD")
+        git_stat, git_out = self.execute_cmd_ex(cmd)
+        if git_stat.returncode != 0:
+            self.logger.warning("Could not get changes since commit %s: %s", commit, git_stat.stderr)
+            return None
+
+        changed_files = set()
+        deleted_files = set()
+        modified_files = set()
+        fields = git_stat.stdout.split("\0")
+        for status, path in zip(fields[0::2], fields[1::2]):
+            if status.startswith("D"):
+                deleted_files.add(path)
+            else:
+                changed_files.add(path)
+                if not status.startswith("A"):
+                    modified_files.add(path)
+        return changed_files, deleted_files, modified_files
+
+    def is_changed_file(self, path, changed_files):
+        """ check if local path is in set of changed files or under a changed (untracked) directory """
+        path = os.path.normpath(path)
+        return path in changed_files or any([ path.startswith(x) for x in changed_files if x.endswith("/")])
+
+    def record_import(self, effective_path, local_path):
+        """ record HEAD as the last imported commit for the workspace path and local path """
+        git_stat, git_out = self.execute_cmd_ex(["git", "rev-parse", "HEAD"])
+        if git_stat.returncode != 0:
+            self.logger.warning("Could not determine HEAD commit - import not recorded")
+            return
+        state = self.load_sync_state("import_state.json")
+        state.setdefault(self.profile_to_use, {}).setdefault(effective_path, {})[local_path] = git_out[0].strip()
+        self.save_sync_state("import_state.json", state)
+
+    def watch_local_changes(self, args):
+        """ Watch command implementation
+
+        Local files are scanned every `--interval` seconds. Changes are collected until no further changes are
+        seen for `--debounce` seconds, so that a burst of saves is imported as a single batch and only the latest
+        state of each file is imported.
+        """
+        self.logger.debug("starting watch")
+        self.get_params(args)
 
-        for x in import_files:
-            cmd = ['databricks', 'workspace', 'import', '--profile', self.profile_to_use,
-                   '--format', args.format, '--language', args.language]
-            if args.overwrite:
-                cmd.append("--overwrite")
+        if "**" in args.src_path or "**" in args.wksp_path:
+            args.recursive = True
+        args.absolute = False
+        args.keep_going = True
 
-            cmd.append(x[0])
-            cmd.append(x[1])
-            self.add_command(cmd)
+        local_path = self.adjust_local_paths(args.src_path, args)
+        effective_path = self.mk_workspace_path(args.wksp_path)
+        if self.client is None:
+            self.logger.warning("Importing with the `databricks` CLI - use `--transport rest` for faster imports")
+
+        files = self.scan_local_files(local_path, args.recursive)
+        print("watching {} files matching [{}] for import to [{}] - press Ctrl-C to stop".format(
+              len(files), local_path, effective_path))
+
+        # workspace folders known to exist, changed files with their state before and after the changes
+        folders = set()
+        previous = {}
+        pending = {}
+        last_change = None
+        try:
+            while True:
+                time.sleep(args.interval)
+                current = self.scan_local_files(local_path, args.recursive)
+                now = time.monotonic()
+                if current != files:
+                    for path in set(files) | set(current):
+                        if files.get(path) != current.get(path):
+                            previous.setdefault(path, files.get(path))
+                            pending[path] = current.get(path)
+                    files = current
+                    last_change = now
+                elif len(pending) > 0 and now - last_change >= args.debounce:
+                    # files created and deleted again within the batch need no changes
+                    changes = { k: v for k, v in pending.items() if v != previous[k] }
+                    if len(changes) > 0:
+                        self.import_local_changes(args, effective_path, changes, previous, folders)
+                    previous = {}
+                    pending = {}
+        except KeyboardInterrupt:
+            print("stopped watching [{}]".format(local_path))
+
+    def import_local_changes(self, args, effective_path, changes, previous, folders):
+        """ Import a batch of changed files and remove the notebooks of deleted files
+
+        A deleted file and a new file with the same modification time and size are reported as a rename.
+
+        :param changes: dictionary of changed paths to their (modification time, size), or None if deleted
+        :param previous: dictionary of changed paths to their state before the changes, or None if new
+        :param folders: set of workspace folders known to exist, updated with the folders created
+        """
+        start = time.monotonic()
+        self.commands_to_execute = []
+        updated = sorted([ x for x, state in changes.items() if state is not None ])
+        deleted = sorted([ x for x, state in changes.items() if state is None ])
+        created = { changes[x]: x for x in updated if previous[x] is None }
+
+        imported = set()
+        for src_file in updated:
+            tgt_file = self.mk_import_target(effective_path, src_file, args.keep_extensions)
+            folder = os.path.dirname(tgt_file)
+            if folder not in folders:
+                self.add_command(['databricks', 'workspace', 'mkdirs', '--profile', self.profile_to_use, folder])
+                folders.add(folder)
+            print(" +++ {} -> {}".format(src_file, tgt_file))
+            self.add_command(self.mk_import_command(args, src_file, tgt_file, overwrite=True))
+            imported.add(tgt_file)
+
+        removed = 0
+        for src_file in deleted:
+            if previous[src_file] in created:
+                print(" renamed {} -> {}".format(src_file, created[previous[src_file]]))
+            tgt_file = self.mk_import_target(effective_path, src_file, args.keep_extensions)
+            if tgt_file in imported:
+                continue
+            if args.delete:
+                print(" --- {}".format(tgt_file))
+                # removed alongside the imports, so that a notebook that no longer exists does not hold them up
+                self.add_command(['databricks', 'workspace', 'rm', '--profile', self.profile_to_use, tgt_file],
+                                 phase="transfer")
+                removed = removed + 1
+            else:
+                self.logger.warning("File [%s] was deleted - notebook [%s] not removed (use `--delete`)",
+                                    src_file, tgt_file)
 
-        self.execute_cmds_ex(args)
+        try:
+            self.execute_cmds_ex(args)
+        except RuntimeError as err:
+            # folders may have been removed from the workspace, so create them again for the next batch
+            folders.clear()
+            self.logger.error("Failed to import changes: %s", err)
+            return
+        print("imported {} and removed {} notebooks in {:.2f}s".format(len(imported), removed,
+                                                                       time.monotonic() - start))
 
     def read_defaults(self):
         """ Read defaults from configuration file"""
         self.homedir = os.path.expanduser('~')
         filepath='{}/.databricks_sync/config.txt'.format(self.homedir)
         try:
+            # keep the configuration already read while the file is unchanged
+            mtime = os.stat(filepath).st_mtime_ns
+            if mtime == self.config_mtime:
+                return
             with open(filepath) as f:
                 logging.info("reading defaults from {}".format(filepath))
                 self.config_text=f.read()
                 self.config=json.loads(self.config_text)
+                self.config_mtime=mtime
         except Exception as err:
             self.logger.debug("Warning: Could not read configuration file - '{}'".format(filepath))
             self.logger.debug(str(err))
+            self.config_mtime=None
             self.config= { "default_profile": "",
                  "default_root": "",
                  "default_language":"",
@@ -703,6 +3670,43 @@ class DatabricksSync:
             self.profile_to_use = self.config['default_profile']
         self.logger.info("using profile: {}".format(self.profile_to_use))
 
+        if getattr(args, "jobs", None) is not None:
+            if args.jobs < 1:
+                raise ValueError("--jobs must be at least 1")
+            self.jobs = args.jobs
+
+        if getattr(args, "retries", None) is not None:
+            self.retries = max(0, args.retries)
+        if self.rate_limiter is None:
+            self.rate_limiter = RateLimiter(self.jobs, rate=getattr(args, "max_rate", None))
+
+        if getattr(args, "no_cache", True):
+            self.catalog = None
+        else:
+            self.cache_ttl = args.cache_ttl if args.cache_ttl is not None else float(self.config.get("cache_ttl", 60))
+            self.refresh_cache = args.refresh
+            if self.catalog is None:
+                cache_dir = os.path.join(os.path.expanduser('~'), ".databricks_sync")
+                os.makedirs(cache_dir, exist_ok=True)
+                self.catalog = WorkspaceCatalog(os.path.join(cache_dir, "catalog.db"),
+                                                max_size=int(self.config.get("cache_max_mb", 64)) * 1024 * 1024)
+
+        # REST clients are kept per profile, so a resident daemon reuses their connections across commands
+        engine = getattr(args, "engine", None) or self.config.get("default_engine") or "threads"
+        if engine == "asyncio" and self.engine is None:
+            self.engine = AsyncEngine(self.jobs, disk_limit=2 * (os.cpu_count() or 1))
+            self.logger.info("using asyncio engine")
+
+        transport = getattr(args, "transport", None) or self.config.get("default_transport") or "cli"
+        if transport == "rest":
+            if self.profile_to_use not in self.clients:
+                self.clients[self.profile_to_use] = WorkspaceClient.from_profile(self.profile_to_use,
+                                                                                 pool_size=self.jobs)
+            self.client = self.clients[self.profile_to_use]
+            self.logger.info("using REST transport")
+        else:
+            self.client = None
+
     def mk_workspace_path(self, s, *argv):
         """ get path - add root path if not absolute"""
         path_root = ""
@@ -728,12 +3732,19 @@ class DatabricksSync:
         print("listing contents of remote workspace: {}".format(effective_path))
 
 
-        showProgress = not args.verbose and not args.debug
-        wksp_contents = self.get_workspace_listing(effective_path, extended=args.long,
-                                                   absolute_paths=args.absolute,
-                                                   recursive=args.recursive,
-                                                   showProgress=showProgress,
-                                                   allow_other=True)
+        # entries are printed as they are listed, unless sorted output was requested
+        if args.sort:
+            showProgress = not args.verbose and not args.debug
+            wksp_contents = self.get_workspace_listing(effective_path, extended=args.long,
+                                                       absolute_paths=args.absolute,
+                                                       recursive=args.recursive,
+                                                       showProgress=showProgress,
+                                                       allow_other=True)
+        else:
+            wksp_contents = self.iter_workspace_listing(effective_path, extended=args.long,
+                                                        absolute_paths=args.absolute,
+                                                        recursive=args.recursive,
+                                                        allow_other=True)
 
         for x in wksp_contents:
             if args.long:
@@ -742,22 +3753,228 @@ class DatabricksSync:
                 print("  {}".format(x[2]))
 
 
-    def sync(self):
-        """ Main entry point """
-        parser, args = self.parse_args()
-
-        if args.command == "ls":
-            self.ls(args)
-        elif args.command == "configure":
-            self.configure(args)
-        elif args.command == "export":
-            self.export_from_workspace(args)
-        elif args.command == "import":
-            self.import_to_workspace(args)
-        elif args.command == "diff":
-            self.diff_against_workspace(args)
+    # commands that are run by the daemon when it is running
+    daemon_commands = ["ls", "diff", "export", "import"]
+
+    def daemon_socket_path(self):
+        """ Get the path of the daemon's Unix socket """
+        return os.path.join(os.path.expanduser('~'), ".databricks_sync", "daemon.sock")
+
+    def daemon_request(self, request):
+        """ Send a request to the daemon, writing any command output to stdout and stderr
+
+        :return: final reply message holding the exit code, or None if the daemon is not running
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.daemon_socket_path())
+        except OSError:
+            sock.close()
+            return None
+
+        with sock, sock.makefile("rwb") as f:
+            f.write((json.dumps(request) + "\n").encode("utf-8"))
+            f.flush()
+            for line in f:
+                message = json.loads(line)
+                if "exit" in message:
+                    return message
+                stream = sys.stdout if message["stream"] == "stdout" else sys.stderr
+                try:
+                    stream.write(message["data"])
+                    stream.flush()
+                except BrokenPipeError:
+                    # the reader of our output went away: closing the socket aborts the command in the daemon.
+                    # Output is sent to devnull so that flushing it at exit does not fail again
+                    devnull = os.open(os.devnull, os.O_WRONLY)
+                    os.dup2(devnull, stream.fileno())
+                    os.close(devnull)
+                    return { "exit": 1 }
+        raise RuntimeError("Daemon closed the connection before the command completed")
+
+    def forward_to_daemon(self, argv):
+        """ Run command in the daemon if it is running
+
+        :return: exit code of the command, or None if the daemon is not running
+        """
+        if os.environ.get("DATABRICKS_SYNC_NO_DAEMON"):
+            return None
+        reply = self.daemon_request({ "argv": argv, "cwd": os.getcwd(), "env": dict(os.environ) })
+        if reply is None:
+            return None
+        self.logger.debug("command run by daemon with exit code %s", reply["exit"])
+        return reply["exit"]
+
+    def run_forwarded_command(self, request, connection):
+        """ Run a command forwarded by a client, in its working directory and environment
+
+        Output, including log messages, is sent back to the client on `connection` as it is written. If the
+        client disconnects, the command is aborted by the failure of its next write.
+
+        :return: exit code of the command
+        """
+        out = DaemonStream(connection, "stdout")
+        err = DaemonStream(connection, "stderr")
+        handlers = [ x for x in logging.getLogger().handlers if type(x) is logging.StreamHandler ]
+        handler_streams = [ (x, x.setStream(err)) for x in handlers ]
+        cwd = os.getcwd()
+        environ = dict(os.environ)
+        exit_code = 0
+        try:
+            os.environ.clear()
+            os.environ.update(request["env"])
+            os.chdir(request["cwd"])
+            with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+                try:
+                    self.reset()
+                    self.sync(request["argv"])
+                except SystemExit as e:
+                    if isinstance(e.code, str):
+                        print(e.code, file=sys.stderr)
+                    exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+                except Exception:
+                    exit_code = 1
+                    if not connection.disconnected:
+                        traceback.print_exc()
+                if not connection.disconnected:
+                    out.flush()
+                    err.flush()
+        except OSError:
+            if not connection.disconnected:
+                raise
+            exit_code = 1
+        finally:
+            try:
+                os.chdir(cwd)
+            finally:
+                try:
+                    os.environ.clear()
+                    os.environ.update(environ)
+                finally:
+                    self.restore_handler_streams(handler_streams)
+        if connection.disconnected:
+            self.logger.warning("daemon client disconnected, command aborted: %s", request["argv"])
+        return exit_code
+
+    def restore_handler_streams(self, handler_streams):
+        """ Point logging handlers back at their previous streams
+
+        `setStream` is not used as it flushes the stream being replaced, which fails if the client is gone.
+        """
+        for handler, stream in handler_streams:
+            handler.acquire()
+            try:
+                handler.stream = stream
+            finally:
+                handler.release()
+
+    def serve_daemon(self):
+        """ Run the daemon in the foreground until stopped """
+        socket_path = self.daemon_socket_path()
+        if os.path.exists(socket_path):
+            if self.daemon_request({ "control": "status" }) is not None:
+                raise RuntimeError("Daemon is already running on [{}]".format(socket_path))
+            os.unlink(socket_path)
+        os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+
+        # the socket is only accessible to the current user
+        umask = os.umask(0o177)
+        try:
+            server = DaemonServer(socket_path, self)
+        finally:
+            os.umask(umask)
+        print("daemon {} listening on {}".format(os.getpid(), socket_path), flush=True)
+        try:
+            while not server.stopping:
+                server.handle_request()
+        finally:
+            server.server_close()
+            os.unlink(socket_path)
+            for client in self.clients.values():
+                client.close()
+            if self.catalog is not None:
+                self.catalog.close()
+        print("daemon {} stopped".format(os.getpid()), flush=True)
+
+    def daemon(self, args):
+        """ Daemon command implementation """
+        socket_path = self.daemon_socket_path()
+        if args.action == "run":
+            self.serve_daemon()
+            return
+
+        status = self.daemon_request({ "control": "status" })
+        if args.action == "status":
+            if status is None:
+                print("daemon is not running")
+            else:
+                print("daemon is running: {}".format(json.dumps(status["status"])))
+        elif args.action == "stop":
+            if status is None:
+                print("daemon is not running")
+            else:
+                self.daemon_request({ "control": "stop" })
+                print("stopped daemon {}".format(status["status"]["pid"]))
+        elif status is not None:
+            print("daemon {} is already running".format(status["status"]["pid"]))
         else:
-            parser.print_help()
+            log_file = os.path.join(os.path.dirname(socket_path), "daemon.log")
+            os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+            with open(log_file, "a") as log:
+                proc = subprocess.Popen([ sys.executable, os.path.abspath(__file__), "daemon", "run" ],
+                                        stdin=subprocess.DEVNULL, stdout=log, stderr=log, start_new_session=True)
+            deadline = time.monotonic() + 10
+            while self.daemon_request({ "control": "status" }) is None:
+                if proc.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("Daemon failed to start - see [{}]".format(log_file))
+                time.sleep(0.05)
+            print("started daemon {} on {}".format(proc.pid, socket_path))
+
+    def sync(self, argv=None):
+        """ Main entry point
+
+        When run from the command line, commands in `daemon_commands` are forwarded to the daemon if it is running
+        """
+        parser, args = self.parse_args(argv)
+
+        if argv is None and args.command in self.daemon_commands:
+            exit_code = self.forward_to_daemon(sys.argv[1:])
+            if exit_code is not None:
+                sys.exit(exit_code)
+
+        # logged by the process running the command, so forwarded commands only log them once, from the daemon
+        if args.verbose:
+            self.logger.info("setting log level to INFO")
+        if args.debug:
+            self.logger.debug("setting log level to DEBUG")
+        self.logger.debug("args: %s", str(args))
+
+        if args.stats is not None or args.trace is not None:
+            self.stats = RunStats()
+
+        try:
+            if args.command == "ls":
+                self.ls(args)
+            elif args.command == "configure":
+                self.configure(args)
+            elif args.command == "export":
+                self.export_from_workspace(args)
+            elif args.command == "import":
+                self.import_to_workspace(args)
+            elif args.command == "diff":
+                self.diff_against_workspace(args)
+            elif args.command == "watch":
+                self.watch_local_changes(args)
+            elif args.command == "daemon":
+                self.daemon(args)
+            else:
+                parser.print_help()
+        finally:
+            if self.engine is not None:
+                self.engine.close()
+                self.engine = None
+            if self.stats is not None:
+                self.stats.write(args.stats, args.trace)
 
 
 
@@ -0,0 +1,89 @@
+""" Tests of the index of local changes built from `git status` """
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from databricks_sync import DatabricksSync, GitStatusIndex
+
+
+class GitStatusIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp_dir = tempfile.mkdtemp(prefix="databricks_sync_test_")
+        os.chdir(self.tmp_dir)
+        self.git("init", "-q")
+        for path in ("src/a.py", "src/sub/b.py", "src/x y.py", "other.py"):
+            self.write_file(path, "1\n")
+        self.git("add", "-A")
+        self.git("commit", "-q", "-m", "base")
+        self.git("mv", "src/x y.py", "src/z w.py")
+        self.write_file("src/sub/b.py", "2\n")
+        self.write_file("src/new.py", "n\n")
+        self.write_file("src/untr/deep/q.py", "q\n")
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def git(self, *args):
+        return subprocess.run([ "git", "-c", "user.name=test", "-c", "user.email=test@localhost" ] + list(args),
+                              check=True, capture_output=True, text=True).stdout
+
+    def write_file(self, path, content):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+    def changes(self, *args, **kwargs):
+        return sorted(DatabricksSync().get_modified_or_untracked_changes(*args, **kwargs))
+
+    def test_parse(self):
+        output = self.git("status", "--porcelain=v2", "-z", "--untracked-files=normal")
+        index = GitStatusIndex.parse(output)
+        self.assertEqual(dict([ (x[1], (x[0], x[2])) for x in index.entries ]), {
+            "src/new.py": ("??", None),
+            "src/untr/": ("??", None),
+            "src/z w.py": ("R ", "src/x y.py"),
+            "src/sub/b.py": (" M", None) })
+
+    def test_parse_prefix(self):
+        output = self.git("status", "--porcelain=v2", "-z", "--untracked-files=normal")
+        index = GitStatusIndex.parse(output, "src/sub/")
+        self.assertEqual(index.entries, [ (" M", "b.py", None) ])
+
+    def test_is_dirty(self):
+        index = GitStatusIndex.parse(self.git("status", "--porcelain=v2", "-z", "--untracked-files=normal"))
+        self.assertTrue(index.is_dirty("src"))
+        self.assertTrue(index.is_dirty("src/z w.py"))
+        self.assertTrue(index.is_dirty("src/untr"))
+        self.assertTrue(index.is_dirty("src/untr/deep/q.py"))
+        self.assertFalse(index.is_dirty("src/a.py"))
+        self.assertFalse(index.is_dirty("other.py"))
+        self.assertFalse(index.is_dirty("sr"))
+
+    def test_changes(self):
+        self.assertEqual(self.changes("src", recursive=True),
+                         [ (" M", "src/sub/b.py"), ("??", "src/new.py"), ("??", "src/untr/"), ("R ", "src/z w.py") ])
+        self.assertEqual(self.changes("src"), [ ("??", "src/new.py"), ("R ", "src/z w.py") ])
+        self.assertEqual(self.changes("src/*.py"), [ ("??", "src/new.py"), ("R ", "src/z w.py") ])
+        self.assertEqual(self.changes("./**/*.py", recursive=True),
+                         [ (" M", "src/sub/b.py"), ("??", "src/new.py"), ("??", "src/untr/"), ("R ", "src/z w.py") ])
+        self.assertEqual(self.changes("src/x y.py"), [])
+        self.assertEqual(self.changes("src/untr/deep/q.py"), [ ("??", "src/untr/") ])
+        self.assertEqual(self.changes("src/untr/deep/q.py", modified_only=True), [])
+        self.assertEqual(self.changes("other.py"), [])
+
+    def test_changes_in_subdirectory(self):
+        os.chdir("src")
+        self.assertEqual(self.changes("*.py"), [ ("??", "new.py"), ("R ", "z w.py") ])
+        self.assertEqual(self.changes("sub"), [ (" M", "sub/b.py") ])
+
+
+if __name__ == "__main__":
+    unittest.main()
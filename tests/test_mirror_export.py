@@ -0,0 +1,54 @@
+""" Tests of `export --mirror` """
+
+import os
+import unittest
+
+from workspace_server import WorkspaceTestCase
+
+
+class MirrorExportTest(WorkspaceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.write_file("setup.py", "x = 1\n")
+        self.write_file("tools/build.py", "y = 1\n")
+        self.git("add", "-A")
+        self.git("commit", "-q", "-m", "base")
+
+    def mirror(self, tgt_path="."):
+        return self.sync("export", "-R", "--format", "SOURCE", "--mirror", self.workspace_root, tgt_path)
+
+    def test_keeps_files_not_exported(self):
+        self.write_file("setup.py", "x = 2\n")
+        self.sync("export", "-R", "--format", "SOURCE", "--mirror", "--no-commit", self.workspace_root, "nb")
+        self.assertEqual(self.read_file("setup.py"), "x = 2\n")
+        self.assertTrue(os.path.exists("tools/build.py"))
+        self.assertTrue(os.path.exists("notebook_0.py"))
+
+    def test_removes_files_of_removed_notebooks(self):
+        self.mirror()
+        self.assertTrue(os.path.exists("folder_0/notebook_1.py"))
+        self.workspace.delete(self.workspace_root + "/folder_0/notebook_1")
+        self.mirror()
+        self.assertFalse(os.path.exists("folder_0/notebook_1.py"))
+        self.assertTrue(os.path.exists("setup.py"))
+        self.assertTrue(os.path.exists("tools/build.py"))
+        self.assertEqual(self.git("status", "--porcelain"), "")
+
+    def test_only_removes_files_below_target(self):
+        self.mirror()
+        self.workspace.delete(self.workspace_root + "/notebook_0")
+        self.mirror("folder_0")
+        self.assertTrue(os.path.exists("notebook_0.py"))
+
+    def test_keeps_modified_files(self):
+        self.mirror()
+        self.workspace.delete(self.workspace_root + "/notebook_0")
+        self.write_file("notebook_0.py", "local change\n")
+        with self.assertRaises(RuntimeError):
+            self.mirror()
+        self.assertEqual(self.read_file("notebook_0.py"), "local change\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
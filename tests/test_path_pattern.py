@@ -0,0 +1,80 @@
+""" Tests of the path patterns used to list local files and workspace folders """
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from databricks_sync import DatabricksSync
+
+
+class PathPatternTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sync = DatabricksSync()
+        self.cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+        for path in ("a.py", "src/b.py", "src/lib/c.py"):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "w") as f:
+                f.write("print(1)\n")
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp_dir.cleanup()
+
+    def test_recursive_listing(self):
+        files = self.sync.get_dir_listing("./**/*.py", recursive=True)
+        self.assertEqual(sorted(files), [ "./a.py", "./src/b.py", "./src/lib/c.py" ])
+
+    def test_trailing_slash_lists_no_files(self):
+        self.assertEqual(self.sync.get_dir_listing("./**/", recursive=True), [])
+        self.assertEqual(self.sync.get_dir_listing("src/", recursive=True), [])
+
+    def test_trailing_slash_matches_folders_only(self):
+        pattern = self.sync.compile_segment_pattern("**/")
+        state = pattern.match_state("src/lib")
+        self.assertTrue(pattern.is_match(state, is_dir=True))
+        self.assertFalse(pattern.is_match(state))
+        self.assertFalse(pattern.is_match(pattern.match_state("src/lib/c")))
+
+    def test_trailing_slash_path_regex(self):
+        regex = self.sync.compile_path_pattern("src/**/")
+        self.assertIsNone(regex.match("src/lib/c.py"))
+        self.assertIsNotNone(regex.match("src/lib/"))
+
+    def test_trailing_slash_across_recursive_segments(self):
+        pattern = self.sync.compile_segment_pattern("src/**/lib/")
+        self.assertTrue(pattern.is_match(pattern.match_state("src/lib"), is_dir=True))
+        self.assertTrue(pattern.is_match(pattern.match_state("src/a/b/lib"), is_dir=True))
+        self.assertFalse(pattern.is_match(pattern.match_state("src/a/lib")))
+        self.assertTrue(pattern.can_descend(pattern.match_state("src/a/lib")))
+        regex = self.sync.compile_path_pattern("**/lib/")
+        self.assertIsNotNone(regex.match("src/a/lib/"))
+        self.assertIsNone(regex.match("src/a/lib"))
+        self.assertIsNone(regex.match("src/lib/c.py"))
+        self.assertEqual(self.sync.get_dir_listing("./**/lib/", recursive=True), [])
+
+    def test_negated_sets(self):
+        files = self.sync.get_dir_listing("./**/[!ab]*.py", recursive=True)
+        self.assertEqual(sorted(files), [ "./src/lib/c.py" ])
+        pattern = self.sync.compile_segment_pattern("[!s]*/**")
+        self.assertFalse(pattern.can_descend(pattern.match_state("src")))
+        self.assertTrue(pattern.is_match(pattern.match_state("lib/c.py")))
+        regex = self.sync.compile_path_pattern("src/[!l]*")
+        self.assertIsNotNone(regex.match("src/b.py"))
+        self.assertIsNone(regex.match("src/lib"))
+
+    def test_literal_brackets_in_set(self):
+        pattern = self.sync.compile_segment_pattern("[[]x].py")
+        self.assertTrue(pattern.is_match(pattern.match_state("[x].py")))
+        self.assertFalse(pattern.is_match(pattern.match_state("x].py")))
+        pattern = self.sync.compile_segment_pattern("[^a].py")
+        self.assertTrue(pattern.is_match(pattern.match_state("^.py")))
+        self.assertFalse(pattern.is_match(pattern.match_state("b.py")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+""" Tests of resuming an interrupted export with `--resume` """
+
+import contextlib
+import io
+import json
+import os
+import unittest
+
+from workspace_server import WorkspaceTestCase
+
+
+class ResumeTest(WorkspaceTestCase):
+
+    def interrupt(self):
+        """ export, then cut the journal back to the plan as if the export had been killed right away """
+        self.sync("export", "-R", "--format", "SOURCE", "--no-commit", self.workspace_root, ".")
+        journal = os.path.join(".git", "databricks_sync", "journal_export.jsonl")
+        with open(journal) as f:
+            header = f.readline()
+        with open(journal, "w") as f:
+            f.write(header)
+        os.remove("notebook_0.py")
+        return json.loads(header)
+
+    def test_resume_without_arguments(self):
+        header = self.interrupt()
+        self.assertEqual(header["args"], { "wksp_path": self.workspace_root, "tgt_path": ".", "format": "SOURCE" })
+        output = self.sync("export", "--resume")
+        self.assertIn("resuming export: 0 of", output)
+        self.assertTrue(os.path.exists("notebook_0.py"))
+
+    def test_resume_with_same_arguments(self):
+        self.interrupt()
+        self.sync("export", "--resume", "--format", "source", self.workspace_root, ".")
+        self.assertTrue(os.path.exists("notebook_0.py"))
+
+    def test_resume_with_conflicting_arguments(self):
+        self.interrupt()
+        with self.assertRaisesRegex(RuntimeError, "--format"):
+            self.sync("export", "--resume", "--format", "DBC")
+        with self.assertRaisesRegex(RuntimeError, "wksp_path"):
+            self.sync("export", "--resume", "/Shared/other", ".")
+        self.assertFalse(os.path.exists("notebook_0.py"))
+
+    def test_arguments_required_without_resume(self):
+        with contextlib.redirect_stderr(io.StringIO()) as err, self.assertRaises(SystemExit):
+            self.sync("export", self.workspace_root, ".")
+        self.assertIn("--format", err.getvalue())
+        with contextlib.redirect_stderr(io.StringIO()) as err, self.assertRaises(SystemExit):
+            self.sync("import", "*.py")
+        self.assertIn("wksp_path, -l/--language", err.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+""" Tests of the classification of failed workspace commands for retries """
+
+import os
+import subprocess
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from databricks_sync import DatabricksSync
+
+
+class ClassifyFailureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sync = DatabricksSync()
+
+    def classify(self, stderr, stdout=""):
+        cmd = [ "databricks", "workspace", "export", "/Shared/503_report", "503.py" ]
+        return self.sync.classify_failure(subprocess.CompletedProcess(cmd, 1, stdout=stdout, stderr=stderr))
+
+    def test_cli_status(self):
+        self.assertEqual(self.classify("Error: HTTPError: 503 Server Error: Service Unavailable for url: "
+                                       "https://host/api/2.0/workspace/export\n"), (True, True))
+        self.assertEqual(self.classify("Error: HTTP_ERROR (502): <html>Bad Gateway</html>\n"), (True, False))
+        self.assertEqual(self.classify("Error: request failed with status code 429\n"), (True, True))
+        self.assertEqual(self.classify("Error: TEMPORARILY_UNAVAILABLE: try again later\n"), (True, True))
+        self.assertEqual(self.classify("Error: Connection refused\n"), (True, False))
+
+    def test_digits_in_paths(self):
+        for path in ("/Shared/503_report", "/Shared/503-report", "/Shared/reports/503", "/Shared/(503)"):
+            message = "Error: RESOURCE_DOES_NOT_EXIST (404): Path ({}) doesn't exist.\n".format(path)
+            self.assertEqual(self.classify(message), (False, False), message)
+            message = "Error: HTTPError: 400 Client Error: Bad Request for url: https://host/{}\n".format(path)
+            self.assertEqual(self.classify(message), (False, False), message)
+        self.assertEqual(self.classify("Error: invalid path\n", stdout="/Shared/reports/500\n"), (False, False))
+
+    def test_rest_status(self):
+        result = subprocess.CompletedProcess([], 1, stdout="", stderr="HTTP_ERROR (503): /Shared/x")
+        result.http_status = 404
+        self.assertEqual(self.sync.classify_failure(result), (False, False))
+        result.http_status = 429
+        self.assertEqual(self.sync.classify_failure(result), (True, True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+""" Tests of the REST transport against the fake workspace """
+
+import os
+import socket
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from workspace_server import WorkspaceTestCase
+from databricks_sync import DatabricksSync, WorkspaceApiError, WorkspaceClient
+
+
+class GatewayErrorHandler(BaseHTTPRequestHandler):
+    """ Answers every request with the HTML error page of a gateway """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        body = b"<html><body><h1>502 Bad Gateway</h1></body></html>"
+        self.send_response(502)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class WorkspaceClientTest(WorkspaceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = WorkspaceClient(self.host, token="test")
+        self.write_file("nb.py", "# Databricks notebook source\nprint(1)\n")
+
+    def tearDown(self):
+        self.client.close()
+        super().tearDown()
+
+    def test_list(self):
+        objects = self.client.list(self.workspace_root)
+        paths = sorted([ x["path"] for x in objects ])
+        self.assertIn(self.workspace_root + "/notebook_0", paths)
+        self.assertIn(self.workspace_root + "/folder_0", paths)
+        self.assertTrue(all([ "object_id" in x and "modified_at" in x for x in objects ]))
+
+    def test_import_export(self):
+        self.client.mkdirs("/Shared/t")
+        self.client.import_file("nb.py", "/Shared/t/nb", "SOURCE", language="PYTHON")
+        self.assertEqual(self.workspace.objects["/Shared/t/nb"]["language"], "PYTHON")
+        size = self.client.export_to_file("/Shared/t/nb", "SOURCE", "out.py")
+        self.assertEqual(self.read_file("out.py"), self.read_file("nb.py"))
+        self.assertEqual(size, os.path.getsize("nb.py"))
+        with self.assertRaises(RuntimeError):
+            self.client.export_to_file("/Shared/t/nb", "SOURCE", "out.py")
+
+    def test_import_existing(self):
+        self.client.import_file("nb.py", "/Shared/t/nb", "SOURCE", language="PYTHON")
+        with self.assertRaises(WorkspaceApiError) as cm:
+            self.client.import_file("nb.py", "/Shared/t/nb", "SOURCE", language="PYTHON")
+        self.assertEqual(cm.exception.error_code, "RESOURCE_ALREADY_EXISTS")
+        self.client.import_file("nb.py", "/Shared/t/nb", "SOURCE", language="PYTHON", overwrite=True)
+
+    def test_delete(self):
+        self.client.delete(self.workspace_root + "/folder_0", recursive=True)
+        self.assertNotIn(self.workspace_root + "/folder_0/notebook_0", self.workspace.objects)
+        with self.assertRaises(WorkspaceApiError) as cm:
+            self.client.delete(self.workspace_root + "/folder_0")
+        self.assertEqual(cm.exception.status, 404)
+        self.assertEqual(cm.exception.error_code, "RESOURCE_DOES_NOT_EXIST")
+
+    def test_execute_ls(self):
+        result, output = self.client.execute([ "databricks", "workspace", "ls", "--profile", "test", "-l",
+                                               "--absolute", self.workspace_root ])
+        self.assertEqual(result.returncode, 0)
+        self.assertIn("NOTEBOOK   {}/notebook_0  PYTHON".format(self.workspace_root), output)
+        self.assertIn(self.workspace_root + "/notebook_0", result.listing_info)
+
+    def test_execute_error(self):
+        result, output = self.client.execute([ "databricks", "workspace", "ls", "--profile", "test", "/Shared/none" ])
+        self.assertEqual(result.returncode, 1)
+        self.assertEqual(result.http_status, 404)
+        self.assertIn("RESOURCE_DOES_NOT_EXIST", result.stderr)
+        self.assertEqual(DatabricksSync().classify_failure(result), (False, False))
+
+    def test_gateway_error_page(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), GatewayErrorHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        client = WorkspaceClient("http://127.0.0.1:{}".format(server.server_address[1]))
+        try:
+            with self.assertRaises(WorkspaceApiError) as cm:
+                client.list("/Shared")
+            self.assertEqual(cm.exception.status, 502)
+            self.assertIn("Bad Gateway", cm.exception.message)
+            result, output = client.execute([ "databricks", "workspace", "ls", "--profile", "test", "/Shared" ])
+            self.assertEqual(result.http_status, 502)
+            self.assertEqual(DatabricksSync().classify_failure(result), (True, False))
+        finally:
+            client.close()
+            server.shutdown()
+            server.server_close()
+
+    def test_connection_error(self):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        client = WorkspaceClient("http://127.0.0.1:{}".format(port))
+        result, output = client.execute([ "databricks", "workspace", "ls", "--profile", "test", "/Shared" ])
+        self.assertEqual(result.returncode, 1)
+        self.assertEqual(result.http_status, 503)
+
+
+if __name__ == "__main__":
+    unittest.main()
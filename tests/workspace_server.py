@@ -0,0 +1,88 @@
+""" Test fixture running `databricks_sync` against the fake workspace of the benchmarks """
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TESTS_DIR, ".."))
+sys.path.insert(0, os.path.join(TESTS_DIR, "..", "benchmarks"))
+
+import fake_workspace
+from databricks_sync import DatabricksSync
+
+PROFILE = "test"
+
+
+class WorkspaceTestCase(unittest.TestCase):
+    """ Serves a fake workspace and runs each test in a new git repository, with a profile pointing at it """
+
+    workspace_root = "/Shared/p"
+    workspace_objects = 12
+
+    def setUp(self):
+        self.workspace = fake_workspace.FakeWorkspace(notebook_size=200)
+        self.workspace.generate(self.workspace_root, self.workspace_objects, notebooks_per_folder=4,
+                                folders_per_folder=2)
+        handler = type("Handler", (fake_workspace.WorkspaceRequestHandler,), { "workspace": self.workspace })
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.host = "http://127.0.0.1:{}".format(self.server.server_address[1])
+
+        self.cwd = os.getcwd()
+        self.environ = dict(os.environ)
+        self.tmp_dir = tempfile.mkdtemp(prefix="databricks_sync_test_")
+        home = os.path.join(self.tmp_dir, "home")
+        os.makedirs(os.path.join(home, ".databricks_sync"))
+        with open(os.path.join(home, ".databricks_sync", "config.txt"), "w") as f:
+            json.dump({ "default_profile": PROFILE, "default_root": "", "default_language": "PYTHON",
+                        "default_format": "SOURCE" }, f)
+        config_file = os.path.join(home, ".databrickscfg")
+        with open(config_file, "w") as f:
+            f.write("[{}]\nhost = {}\ntoken = test\n".format(PROFILE, self.host))
+        os.environ.update({ "HOME": home, "DATABRICKS_CONFIG_FILE": config_file,
+                            "GIT_AUTHOR_NAME": "test", "GIT_AUTHOR_EMAIL": "test@localhost",
+                            "GIT_COMMITTER_NAME": "test", "GIT_COMMITTER_EMAIL": "test@localhost" })
+
+        repo = os.path.join(self.tmp_dir, "repo")
+        os.makedirs(repo)
+        os.chdir(repo)
+        self.git("init", "-q")
+        self.git("commit", "-q", "--allow-empty", "-m", "init")
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        os.environ.clear()
+        os.environ.update(self.environ)
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def git(self, *args):
+        return subprocess.run([ "git" ] + list(args), check=True, capture_output=True, text=True).stdout
+
+    def write_file(self, path, content):
+        if len(os.path.dirname(path)) > 0:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+    def read_file(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def sync(self, *argv):
+        """ run a `databricks_sync` command with the REST transport, returning its output """
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            DatabricksSync().sync(list(argv[:1]) + [ "--transport", "rest" ] + list(argv[1:]))
+        return out.getvalue()